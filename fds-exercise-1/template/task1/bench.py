@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from main import (
+    PhaseProfiler,
+    count_causal_edges,
+    compute_repo_clocks,
+    intern_repo,
+    iter_causal_edges,
+    iter_reduced_edges,
+    load_repo,
+    repo_parent_map,
+    write_clocks_json,
+    write_dot,
+)
+from synth import generate_repo
+
+
+def bench_size(json_path: str, out_dir: str, engine: str, trace_memory: bool) -> Dict[str, Dict[str, object]]:
+    with PhaseProfiler(trace_memory=trace_memory) as profiler:
+        with profiler.phase('load_repo'):
+            repo = intern_repo(*load_repo(json_path))
+        with profiler.phase('compute_vector_clocks'):
+            clocks = compute_repo_clocks(repo, engine)
+        commits = sorted(clocks)
+        owner = dict(zip(repo.commits, repo.commit_branch))
+        parents = repo_parent_map(repo)
+        with profiler.phase('count_causal_edges'):
+            count_causal_edges(commits, clocks, owner)
+        with profiler.phase('build_causal_edges'):
+            sum(1 for _ in iter_causal_edges(commits, clocks, owner))
+        with profiler.phase('transitive_reduction'):
+            sum(1 for _ in iter_reduced_edges(commits, parents, clocks, owner))
+        with profiler.phase('write_clocks_json'):
+            write_clocks_json(clocks, os.path.join(out_dir, 'vector_clocks.json'), len(repo.branches))
+        with profiler.phase('write_dot_full'):
+            write_dot(commits, iter_causal_edges(commits, clocks, owner), clocks,
+                      os.path.join(out_dir, 'causal_full.dot'), num_branches=len(repo.branches))
+        with profiler.phase('write_dot_min'):
+            write_dot(commits, iter_reduced_edges(commits, parents, clocks, owner), clocks,
+                      os.path.join(out_dir, 'causal_min.dot'), num_branches=len(repo.branches))
+    return profiler.phases
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Time and measure memory of every task1 phase across a size sweep.')
+    parser.add_argument('--depths', default='25,50,100,200', help='comma separated commits-per-branch values')
+    parser.add_argument('--branches', type=int, default=16)
+    parser.add_argument('--merge-prob', type=float, default=0.1)
+    parser.add_argument('--fan-in', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', default='python')
+    parser.add_argument('--no-tracemalloc', action='store_true',
+                        help='skip peak memory tracing, which slows every phase down')
+    parser.add_argument('--report', default='bench_report.json')
+    args = parser.parse_args(argv)
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for depth in (int(d) for d in args.depths.split(',')):
+            json_path = os.path.join(tmp, f'repo_{depth}.json')
+            with open(json_path, 'w') as f:
+                json.dump(generate_repo(args.branches, depth, args.merge_prob, args.fan_in, args.seed), f)
+            phases = bench_size(json_path, tmp, args.engine, not args.no_tracemalloc)
+            runs.append({
+                'branches': args.branches,
+                'depth': depth,
+                'commits': args.branches * depth,
+                'input_bytes': os.path.getsize(json_path),
+                'phases': phases,
+            })
+            total = sum(p['wall_s'] for p in phases.values())
+            print(f'depth={depth:<6} commits={args.branches * depth:<8} total={total:.3f}s')
+
+    report = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'params': {
+            'branches': args.branches,
+            'merge_prob': args.merge_prob,
+            'fan_in': args.fan_in,
+            'seed': args.seed,
+            'engine': args.engine,
+            'tracemalloc': not args.no_tracemalloc,
+        },
+        'runs': runs,
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Report written to', args.report)
+
+
+if __name__ == '__main__':
+    main()
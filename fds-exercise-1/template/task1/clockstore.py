@@ -0,0 +1,306 @@
+import argparse
+import json
+import mmap
+import struct
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # matrix() needs numpy, lookups do not
+    np = None
+
+
+# Layout (little endian):
+#   header   magic 'VCLK', version u16, value width u16, n_commits u64, n_branches u64, id_width u32
+#   ids      n_commits slots of id_width bytes, UTF-8, NUL padded, sorted bytewise
+#   clocks   n_commits x n_branches int32 matrix starting on an 8-byte boundary; row i is ids[i]
+MAGIC = b'VCLK'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQI4x')
+VALUE_WIDTH = 4
+
+
+def _matrix_offset(n_commits: int, id_width: int) -> int:
+    end = HEADER.size + n_commits * id_width
+    return (end + 7) & ~7
+
+
+def _dense(clock, num_branches: int) -> List[int]:
+    if isinstance(clock, dict):
+        dense = [0] * num_branches
+        for i, x in clock.items():
+            dense[i] = x
+        return dense
+    return clock
+
+
+def write_clocks_bin(clocks: Dict[str, List[int]], out_path: str, num_branches: Optional[int] = None) -> None:
+    if num_branches is None:
+        first = next(iter(clocks.values()), [])
+        if isinstance(first, dict):
+            raise ValueError('num_branches is required to write sparse clocks')
+        num_branches = len(first)
+    encoded = sorted((c.encode('utf-8'), c) for c in clocks)
+    if any(b'\0' in key for key, _ in encoded):
+        raise ValueError('commit ids must not contain NUL bytes')
+    id_width = max((len(key) for key, _ in encoded), default=0)
+    row = struct.Struct(f'<{num_branches}i')
+
+    with open(out_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, VALUE_WIDTH, len(encoded), num_branches, id_width))
+        for key, _ in encoded:
+            f.write(key.ljust(id_width, b'\0'))
+        f.write(b'\0' * (_matrix_offset(len(encoded), id_width) - HEADER.size - len(encoded) * id_width))
+        for _, c in encoded:
+            clock = _dense(clocks[c], num_branches)
+            if len(clock) != num_branches:
+                raise ValueError(f'clock for {c!r} has {len(clock)} components, expected {num_branches}')
+            f.write(row.pack(*clock))
+
+
+class ClockStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # mmap refuses empty files
+            self._file.close()
+            raise ValueError(f'{path}: not a clock store (empty file)')
+        if len(self._mm) < HEADER.size:
+            self.close()
+            raise ValueError(f'{path}: not a clock store (truncated header)')
+        magic, version, width, n, b, id_width = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or width != VALUE_WIDTH:
+            self.close()
+            raise ValueError(f'{path}: not a version {VERSION} clock store')
+        self.num_commits = n
+        self.num_branches = b
+        self._id_width = id_width
+        self._matrix_offset = _matrix_offset(n, id_width)
+        self._row = struct.Struct(f'<{b}i')
+        if len(self._mm) < self._matrix_offset + n * self._row.size:
+            self.close()
+            raise ValueError(f'{path}: clock store is truncated')
+
+    def close(self) -> None:
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self) -> 'ClockStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.num_commits
+
+    def _key_at(self, i: int) -> bytes:
+        start = HEADER.size + i * self._id_width
+        return self._mm[start:start + self._id_width]
+
+    def commit_at(self, i: int) -> str:
+        return self._key_at(i).rstrip(b'\0').decode('utf-8')
+
+    def index_of(self, commit: str) -> int:
+        key = commit.encode('utf-8')
+        if len(key) > self._id_width:
+            return -1
+        key = key.ljust(self._id_width, b'\0')
+        lo, hi = 0, self.num_commits
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.num_commits and self._key_at(lo) == key else -1
+
+    def clock_at(self, i: int) -> List[int]:
+        return list(self._row.unpack_from(self._mm, self._matrix_offset + i * self._row.size))
+
+    def __contains__(self, commit: str) -> bool:
+        return self.index_of(commit) >= 0
+
+    def __getitem__(self, commit: str) -> List[int]:
+        i = self.index_of(commit)
+        if i < 0:
+            raise KeyError(commit)
+        return self.clock_at(i)
+
+    def get(self, commit: str, default=None):
+        i = self.index_of(commit)
+        return self.clock_at(i) if i >= 0 else default
+
+    def commits(self) -> Iterator[str]:
+        return (self.commit_at(i) for i in range(self.num_commits))
+
+    def items(self) -> Iterator[Tuple[str, List[int]]]:
+        return ((self.commit_at(i), self.clock_at(i)) for i in range(self.num_commits))
+
+    def matrix(self) -> 'np.memmap':
+        if np is None:
+            raise RuntimeError('ClockStore.matrix() requires numpy')
+        return np.memmap(self.path, dtype='<i4', mode='r', offset=self._matrix_offset,
+                         shape=(self.num_commits, self.num_branches))
+
+
+def load_clocks_bin(path: str) -> Dict[str, List[int]]:
+    with ClockStore(path) as store:
+        return dict(store.items())
+
+
+def json_to_bin(json_path: str, bin_path: str) -> None:
+    with open(json_path, 'r') as f:
+        clocks = json.load(f)
+    write_clocks_bin(clocks, bin_path)
+
+
+def bin_to_json(bin_path: str, json_path: str) -> None:
+    # Same layout as main.write_clocks_json: keys sorted, indent=2.
+    with ClockStore(bin_path) as store, open(json_path, 'w') as f:
+        json.dump(dict(store.items()), f, indent=2)
+
+
+# Delta format: each clock is a base commit (its first parent) plus the components
+# that differ from the base's clock. Every `checkpoint_every` links along a base
+# chain the clock is stored against the zero clock instead, which bounds the work
+# needed to rebuild any single clock.
+DELTA_FORMAT = 'vclock-delta'
+DELTA_VERSION = 1
+
+
+def write_clocks_delta(
+    clocks: Dict[str, List[int]],
+    commit_to_parents: Dict[str, List[str]],
+    out_path: str,
+    num_branches: int,
+    checkpoint_every: int = 64,
+) -> None:
+    if checkpoint_every < 1:
+        raise ValueError('checkpoint_every must be at least 1')
+
+    def base_of(c: str) -> Optional[str]:
+        parents = commit_to_parents.get(c)
+        return parents[0] if parents and parents[0] in clocks else None
+
+    depth: Dict[str, int] = {}
+    for commit in clocks:
+        pending = []
+        c: Optional[str] = commit
+        while c is not None and c not in depth:
+            pending.append(c)
+            c = base_of(c)
+        d = depth[c] if c is not None else -1
+        for c in reversed(pending):
+            d = 0 if base_of(c) is None or d + 1 >= checkpoint_every else d + 1
+            depth[c] = d
+
+    entries = {}
+    for c in sorted(clocks):
+        clock = _dense(clocks[c], num_branches)
+        base = base_of(c) if depth[c] else None
+        ref = _dense(clocks[base], num_branches) if base is not None else None
+        delta = [[i, x] for i, x in enumerate(clock) if x != (ref[i] if ref is not None else 0)]
+        entries[c] = {'p': base, 'd': delta}
+    with open(out_path, 'w') as f:
+        json.dump({
+            'format': DELTA_FORMAT,
+            'version': DELTA_VERSION,
+            'branches': num_branches,
+            'checkpoint_every': checkpoint_every,
+            'clocks': entries,
+        }, f, separators=(',', ':'))
+
+
+class DeltaClockReader:
+    # Parses the delta file once and rebuilds clocks on access, walking at most
+    # checkpoint_every base links. Recently rebuilt clocks are kept in an LRU cache
+    # and also serve as starting points for their descendants.
+    def __init__(self, path: str, cache_size: int = 4096):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data.get('format') != DELTA_FORMAT or data.get('version') != DELTA_VERSION:
+            raise ValueError(f'{path}: not a version {DELTA_VERSION} delta clock file')
+        self.num_branches = data['branches']
+        self._entries = data['clocks']
+        self._cache: 'OrderedDict[str, List[int]]' = OrderedDict()
+        self._cache_size = cache_size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, commit: str) -> bool:
+        return commit in self._entries
+
+    def __getitem__(self, commit: str) -> List[int]:
+        cached = self._cache.get(commit)
+        if cached is not None:
+            self._cache.move_to_end(commit)
+            return list(cached)
+        if commit not in self._entries:
+            raise KeyError(commit)
+        chain = []
+        c: Optional[str] = commit
+        while c is not None and c not in self._cache:
+            chain.append(c)
+            c = self._entries[c]['p']
+        clock = list(self._cache[c]) if c is not None else [0] * self.num_branches
+        for c in reversed(chain):
+            for i, x in self._entries[c]['d']:
+                clock[i] = x
+        self._cache[commit] = clock
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return list(clock)
+
+    def get(self, commit: str, default=None):
+        return self[commit] if commit in self._entries else default
+
+    def commits(self) -> Iterator[str]:
+        return iter(sorted(self._entries))
+
+    def items(self) -> Iterator[Tuple[str, List[int]]]:
+        return ((c, self[c]) for c in self.commits())
+
+
+def delta_to_json(delta_path: str, json_path: str) -> None:
+    with open(json_path, 'w') as f:
+        json.dump(dict(DeltaClockReader(delta_path).items()), f, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Convert and inspect binary and delta vector clock files.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('to-bin', help='convert vector_clocks.json to the binary format')
+    p.add_argument('json_path')
+    p.add_argument('bin_path')
+    p = sub.add_parser('to-json', help='convert a binary store back to vector_clocks.json')
+    p.add_argument('bin_path')
+    p.add_argument('json_path')
+    p = sub.add_parser('delta-to-json', help='expand a delta clock file into vector_clocks.json')
+    p.add_argument('delta_path')
+    p.add_argument('json_path')
+    p = sub.add_parser('get', help='print the clocks of the given commits')
+    p.add_argument('bin_path')
+    p.add_argument('commits', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.command == 'to-bin':
+        json_to_bin(args.json_path, args.bin_path)
+    elif args.command == 'to-json':
+        bin_to_json(args.bin_path, args.json_path)
+    elif args.command == 'delta-to-json':
+        delta_to_json(args.delta_path, args.json_path)
+    else:
+        with ClockStore(args.bin_path) as store:
+            for commit in args.commits:
+                print(commit, store.get(commit, 'not found'))
+
+
+if __name__ == '__main__':
+    main()
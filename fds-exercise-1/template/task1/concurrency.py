@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from main import InternedRepo, intern_repo, load_repo, load_repo_stream
+from query import CausalIndex
+
+
+def concurrent_counts(index: CausalIndex) -> Dict[str, int]:
+    # For c on branch p at position t: ancestors (inclusive) number sum(clock_c),
+    # descendants (inclusive) are the commits with clock[p] >= t, counted with one
+    # histogram of component p per branch. Everything else is concurrent with c.
+    clocks = index.clocks
+    n = len(clocks)
+    counts: Dict[str, int] = {}
+    for p, chain in index.chains.items():
+        at_least = [0] * (chain.positions[-1] + 2)
+        for clock in clocks.values():
+            at_least[clock[p]] += 1
+        for t in range(len(at_least) - 2, -1, -1):
+            at_least[t] += at_least[t + 1]
+        for c, t in zip(chain.commits, chain.positions):
+            clock = clocks[c]
+            ancestors = sum(clock.values()) if isinstance(clock, dict) else sum(clock)
+            counts[c] = n - ancestors - at_least[t] + 1
+    return counts
+
+
+def history_width(index: CausalIndex) -> Tuple[int, List[str]]:
+    # Dilworth: width = n - maximum matching between "u" and "v" copies of the
+    # commits, with u -> v whenever u happened before v. The branch chains already
+    # give a matching of size n - #branches, so at most #branches augmenting paths
+    # are needed. Descendants of u on a chain are a suffix, and a per-chain
+    # next-unvisited pointer (path-compressed) keeps each phase at one visit per
+    # commit. The final failed search yields a maximum antichain (Konig).
+    names = sorted(index.clocks)
+    ordinal = {c: i for i, c in enumerate(names)}
+    clocks = [index.clocks[c] for c in names]
+    owner = [index.owner[c] for c in names]
+    chain_branch = list(index.chains)
+    chains = [[ordinal[c] for c in chain.commits] for chain in index.chains.values()]
+    n = len(names)
+
+    match_succ = [-1] * n
+    match_pred = [-1] * n
+    for chain in chains:
+        for a, b in zip(chain, chain[1:]):
+            match_succ[a] = b
+            match_pred[b] = a
+
+    def suffix_start(u: int, ci: int) -> int:
+        # strict descendants only: on u's own chain the suffix starts after u
+        p = owner[u]
+        start = bisect_left(chains[ci], clocks[u][p], key=lambda x: clocks[x][p])
+        return start + 1 if chain_branch[ci] == p else start
+
+    while True:
+        skip = [list(range(len(chain) + 1)) for chain in chains]
+        expanded = [False] * n
+        visited = [False] * n
+
+        def next_unvisited(ci: int, i: int) -> int:
+            nxt = skip[ci]
+            root = i
+            while nxt[root] != root:
+                root = nxt[root]
+            while nxt[i] != root:
+                nxt[i], i = root, nxt[i]
+            return root
+
+        augmented = False
+        for root in range(n):
+            if match_succ[root] >= 0 or expanded[root]:
+                continue
+            expanded[root] = True
+            # frames: [u, chain index, position in chain, v chosen from this frame]
+            stack = [[root, 0, None, -1]]
+            while stack:
+                frame = stack[-1]
+                u, ci, pos = frame[0], frame[1], frame[2]
+                found = -1
+                while ci < len(chains):
+                    if pos is None:
+                        pos = suffix_start(u, ci)
+                    pos = next_unvisited(ci, pos)
+                    if pos < len(chains[ci]):
+                        found = chains[ci][pos]
+                        skip[ci][pos] = pos + 1
+                        break
+                    ci, pos = ci + 1, None
+                frame[1], frame[2] = ci, pos
+                if found < 0:
+                    stack.pop()
+                    continue
+                visited[found] = True
+                frame[3] = found
+                w = match_pred[found]
+                if w < 0:
+                    for fu, _, _, fv in stack:
+                        match_succ[fu] = fv
+                        match_pred[fv] = fu
+                    augmented = True
+                    break
+                if not expanded[w]:
+                    expanded[w] = True
+                    stack.append([w, 0, None, -1])
+            if augmented:
+                break
+        if not augmented:
+            antichain = [names[x] for x in range(n) if expanded[x] and not visited[x]]
+            return n - sum(1 for x in match_succ if x >= 0), antichain
+
+
+def iter_concurrent_pairs(index: CausalIndex) -> Iterator[Tuple[str, str]]:
+    for c in sorted(index.clocks):
+        for x in sorted(index.concurrent_with(c)):
+            if c < x:
+                yield c, x
+
+
+def concurrency_report(index: CausalIndex, with_width: bool = True) -> Dict[str, object]:
+    counts = concurrent_counts(index)
+    n = len(counts)
+    report: Dict[str, object] = {
+        'commits': n,
+        'branches': len(index.chains),
+        'concurrent_pairs': sum(counts.values()) // 2,
+        'max_concurrent': max(counts.values(), default=0),
+        'mean_concurrent': round(sum(counts.values()) / n, 6) if n else 0.0,
+    }
+    if with_width:
+        width, antichain = history_width(index)
+        report['width'] = width
+        report['max_antichain'] = antichain
+    report['concurrent_counts'] = dict(sorted(counts.items()))
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Summarize concurrency in a repository history without enumerating commit pairs.')
+    parser.add_argument('--input', help='repository JSON (default: example.json next to this script)')
+    parser.add_argument('--stream', action='store_true', help='parse the repository JSON incrementally')
+    parser.add_argument('--report', default='concurrency_report.json')
+    parser.add_argument('--pairs', help='also stream every concurrent pair to this file, one "a b" per line')
+    parser.add_argument('--no-width', action='store_true',
+                        help='skip the width / maximum antichain computation')
+    args = parser.parse_args(argv)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    json_path = args.input or os.path.join(here, 'example.json')
+    repo: InternedRepo = load_repo_stream(json_path) if args.stream else intern_repo(*load_repo(json_path))
+    index = CausalIndex.from_repo(repo)
+
+    report = concurrency_report(index, with_width=not args.no_width)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Concurrent pairs:', report['concurrent_pairs'])
+    if 'width' in report:
+        print('Width:', report['width'])
+    print('Report written to', args.report)
+
+    if args.pairs:
+        with open(args.pairs, 'w') as f:
+            for a, b in iter_concurrent_pairs(index):
+                f.write(f'{a} {b}\n')
+        print('Concurrent pairs written to', args.pairs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import json
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+# Same field order as main.InternedRepo: branches, commits, commit_branch, commit_parents.
+History = Tuple[List[str], List[str], List[int], List[List[int]]]
+
+
+def _git(path: str, *args: str) -> str:
+    proc = subprocess.run(['git', '-C', path, *args], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {proc.stderr.strip()}")
+    return proc.stdout
+
+
+def branch_tips(path: str, primary: Optional[str] = None) -> List[Tuple[str, str]]:
+    # Local branches by name, with the primary branch (HEAD's branch by default) first.
+    tips = []
+    for line in _git(path, 'for-each-ref', '--format=%(refname:short) %(objectname)', 'refs/heads').splitlines():
+        name, sha = line.rsplit(' ', 1)
+        tips.append((name, sha))
+    if primary is None:
+        try:
+            primary = _git(path, 'symbolic-ref', '--quiet', '--short', 'HEAD').strip()
+        except RuntimeError:  # detached HEAD
+            primary = None
+    return sorted(tips, key=lambda t: (t[0] != primary, t[0]))
+
+
+def load_git_history(path: str, primary: Optional[str] = None) -> History:
+    tips = branch_tips(path, primary)
+    ordinal: Dict[str, int] = {}
+    commits: List[str] = []
+    parents: List[List[int]] = []
+
+    def intern(sha: str) -> int:
+        i = ordinal.get(sha)
+        if i is None:
+            i = ordinal[sha] = len(commits)
+            commits.append(sha)
+            parents.append([])
+        return i
+
+    # Children come before parents in --topo-order output; parents are interned on
+    # first mention and filled in when their own line arrives.
+    order: List[int] = []
+    proc = subprocess.Popen(['git', '-C', path, 'rev-list', '--parents', '--topo-order', '--branches'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    for line in proc.stdout:
+        ids = line.split()
+        if not ids:
+            continue
+        c = intern(ids[0])
+        parents[c] = [intern(p) for p in ids[1:]]
+        order.append(c)
+    stderr = proc.stderr.read()
+    if proc.wait() != 0:
+        raise RuntimeError(f'git rev-list failed: {stderr.strip()}')
+
+    # First-parent rule: in branch order, each branch claims the unclaimed commits
+    # on the first-parent chain of its tip. Commits left over (history of deleted,
+    # merged branches) are claimed the same way, newest first, under 'merged@<sha>'.
+    # Every branch is therefore a chain. Branches whose tip is already claimed by an
+    # earlier branch get no commits and are left out.
+    branch = [-1] * len(commits)
+    branches: List[str] = []
+
+    def claim(start: int, name: str) -> None:
+        k = len(branches)
+        c: Optional[int] = start
+        while c is not None and branch[c] < 0:
+            branch[c] = k
+            c = parents[c][0] if parents[c] else None
+        if branch[start] == k:
+            branches.append(name)
+
+    for name, sha in tips:
+        if sha in ordinal:
+            claim(ordinal[sha], name)
+    for c in order:
+        if branch[c] < 0:
+            claim(c, f'merged@{commits[c][:10]}')
+    return branches, commits, branch, parents
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Export a git repository as {branch: {commit: [parents]}} using the first-parent rule.')
+    parser.add_argument('repo_path')
+    parser.add_argument('out_path')
+    parser.add_argument('--primary', help='branch that claims its first-parent history first (default: HEAD)')
+    args = parser.parse_args(argv)
+
+    branches, commits, branch, parents = load_git_history(args.repo_path, args.primary)
+    data: Dict[str, Dict[str, List[str]]] = {name: {} for name in branches}
+    for i, c in enumerate(commits):
+        data[branches[branch[i]]][c] = [commits[p] for p in parents[i]]
+    with open(args.out_path, 'w') as f:
+        json.dump(data, f)
+
+
+if __name__ == '__main__':
+    main()
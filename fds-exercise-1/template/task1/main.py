@@ -1,6 +1,34 @@
+import argparse
+import cProfile
+import gzip
+import hashlib
 import json   
+import multiprocessing
 import os
-from typing import Dict, List, Tuple, Set
+import shutil
+import sys
+import time
+import tracemalloc
+from bisect import bisect_right
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+from json.decoder import scanstring
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Set
+
+try:
+    import numpy as np
+except ImportError:  # only the matrix engine needs numpy
+    np = None
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak RSS is then omitted
+    resource = None
+
+from clockstore import load_clocks_bin, write_clocks_bin, write_clocks_delta
+from gitrepo import branch_tips, load_git_history
 
 
 BranchIndex = Dict[str, int]
@@ -8,6 +36,33 @@ CommitToBranch = Dict[str, str]
 CommitToParents = Dict[str, List[str]]
 Clock = List[int]
 CommitToClock = Dict[str, Clock]
+CommitToComponent = Dict[str, int]
+
+ENGINES = ('python', 'numpy', 'sparse', 'auto')
+CLOCK_DTYPE = 'int32'
+CHECK_PRECEDENCE = os.environ.get('FDS_CHECK_PRECEDENCE') == '1'
+SPARSE_DENSITY_THRESHOLD = 0.125
+ARTIFACTS = ('clocks', 'bin', 'delta', 'full', 'min')
+CACHE_VERSION = 1
+WRITE_CHUNK_CHARS = 1 << 20
+
+# Precedence call counts for PhaseProfiler; only updated while COUNT_CALLS is set.
+COUNT_CALLS = False
+CALL_COUNTS: Counter = Counter()
+
+
+class SparseClock(dict):
+    # Non-zero components only; missing components read as 0 so clock[k] works
+    # the same way as on a dense list.
+    def __missing__(self, key: int) -> int:
+        return 0
+
+
+class InternedRepo(NamedTuple):
+    branches: List[str]
+    commits: List[str]
+    commit_branch: List[int]
+    commit_parents: List[List[int]]
 
 
 def load_repo(json_path: str) -> Tuple[BranchIndex, CommitToBranch, CommitToParents]:
@@ -25,6 +80,107 @@ def load_repo(json_path: str) -> Tuple[BranchIndex, CommitToBranch, CommitToPare
     return branch_to_index, commit_to_branch, commit_to_parents
 
 
+def _iter_json_tokens(f: TextIO, chunk_size: int) -> Iterator[Tuple[str, Optional[str]]]:
+    buf = ''
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n':
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        ch = buf[pos]
+        if ch == '"':
+            try:
+                value, end = scanstring(buf, pos + 1)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the string (or one of its escapes) continues in the next chunk
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield '"', value
+            pos = end
+        elif ch in '{}[]:,':
+            yield ch, None
+            pos += 1
+        else:
+            raise ValueError(f'unexpected character {ch!r} in repository JSON; expected {{branch: {{commit: [parents]}}}}')
+
+
+def load_repo_stream(json_path: str, chunk_size: int = 1 << 20) -> InternedRepo:
+    branch_to_index: BranchIndex = {}
+    commits: List[str] = []
+    commit_branch: List[int] = []
+    commit_parents: List[List[int]] = []
+    ordinal: Dict[str, int] = {}
+
+    def intern(commit: str) -> int:
+        i = ordinal.get(commit)
+        if i is None:
+            i = ordinal[commit] = len(commits)
+            commits.append(commit)
+            commit_branch.append(-1)
+            commit_parents.append([])
+        return i
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        tokens = _iter_json_tokens(f, chunk_size)
+
+        def expect(kind: str) -> Optional[str]:
+            got, value = next(tokens, ('end of file', None))
+            if got != kind:
+                raise ValueError(f'{json_path}: expected {kind!r} but found {got!r}')
+            return value
+
+        def items(close: str) -> Iterator[Optional[str]]:
+            kind, value = next(tokens, ('end of file', None))
+            while kind != close:
+                if kind != '"':
+                    raise ValueError(f'{json_path}: expected a string but found {kind!r}')
+                yield value
+                kind, _ = next(tokens, ('end of file', None))
+                if kind == ',':
+                    kind, value = next(tokens, ('end of file', None))
+                    if kind == close:
+                        raise ValueError(f'{json_path}: trailing comma before {close!r}')
+                elif kind != close:
+                    raise ValueError(f'{json_path}: expected {close!r} but found {kind!r}')
+
+        expect('{')
+        for branch in items('}'):
+            expect(':')
+            idx = branch_to_index.setdefault(branch, len(branch_to_index))
+            expect('{')
+            for commit in items('}'):
+                expect(':')
+                expect('[')
+                i = intern(commit)
+                commit_branch[i] = idx
+                commit_parents[i] = [intern(p) for p in items(']')]
+        if next(tokens, None) is not None:
+            raise ValueError(f'{json_path}: trailing data after the repository object')
+
+    undefined = [c for c, b in zip(commits, commit_branch) if b < 0]
+    if undefined:
+        raise ValueError(f"{json_path}: parents that are not in any branch: {undefined[:10]}")
+    branches = sorted(branch_to_index, key=branch_to_index.__getitem__)
+    return InternedRepo(branches, commits, commit_branch, commit_parents)
+
+
+def repo_parent_map(repo: InternedRepo) -> CommitToParents:
+    return {c: [repo.commits[p] for p in parents] for c, parents in zip(repo.commits, repo.commit_parents)}
+
+
 def elementwise_max(vectors: List[Clock]) -> Clock:
     if not vectors:
         return []
@@ -37,40 +193,218 @@ def elementwise_max(vectors: List[Clock]) -> Clock:
     return result
 
 
+def sparse_max(vectors: List[SparseClock]) -> SparseClock:
+    if not vectors:
+        return SparseClock()
+    result = SparseClock(vectors[0])
+    for vec in vectors[1:]:
+        for i, x in vec.items():
+            if x > result[i]:
+                result[i] = x
+    return result
+
+
+def sparse_precedes(a: SparseClock, b: SparseClock) -> bool:
+    return a != b and all(x <= b[i] for i, x in a.items())
+
+
+def to_sparse(clock: Clock) -> SparseClock:
+    return SparseClock((i, x) for i, x in enumerate(clock) if x)
+
+
+def to_dense(clock, num_branches: int) -> Clock:
+    if not isinstance(clock, SparseClock):
+        return clock
+    dense = [0] * num_branches
+    for i, x in clock.items():
+        dense[i] = x
+    return dense
+
+
+def intern_repo(
+    branch_to_index: BranchIndex,
+    commit_to_branch: CommitToBranch,
+    commit_to_parents: CommitToParents,
+) -> InternedRepo:
+    branches = sorted(branch_to_index, key=branch_to_index.__getitem__)
+    commits = list(commit_to_branch.keys())
+    ordinal = {c: i for i, c in enumerate(commits)}
+    commit_branch = [branch_to_index[commit_to_branch[c]] for c in commits]
+    commit_parents: List[List[int]] = []
+    for c in commits:
+        parents = commit_to_parents.get(c, [])
+        missing = [p for p in parents if p not in ordinal]
+        if missing:
+            raise ValueError(f"commit {c!r} has parents that are not in any branch: {missing}")
+        commit_parents.append([ordinal[p] for p in parents])
+    return InternedRepo(branches, commits, commit_branch, commit_parents)
+
+
+def topological_order(repo: InternedRepo) -> List[int]:
+    n = len(repo.commits)
+    pending = [len(parents) for parents in repo.commit_parents]
+    children: List[List[int]] = [[] for _ in range(n)]
+    for child, parents in enumerate(repo.commit_parents):
+        for p in parents:
+            children[p].append(child)
+
+    ready = deque(i for i in range(n) if pending[i] == 0)
+    order: List[int] = []
+    while ready:
+        i = ready.popleft()
+        order.append(i)
+        for child in children[i]:
+            pending[child] -= 1
+            if pending[child] == 0:
+                ready.append(child)
+
+    if len(order) != n:
+        stuck = sorted(repo.commits[i] for i in range(n) if pending[i] > 0)
+        shown = ', '.join(stuck[:10]) + (', ...' if len(stuck) > 10 else '')
+        raise ValueError(f"commit graph has a cycle; {len(stuck)} commits cannot be ordered: {shown}")
+    return order
+
+
+def compute_clock_matrix(repo: InternedRepo, out: Optional['np.ndarray'] = None) -> 'np.ndarray':
+    # `out`, if given, is a (commits, branches) CLOCK_DTYPE array to fill in place.
+    if np is None:
+        raise RuntimeError("the 'numpy' engine requires numpy to be installed")
+    if out is None:
+        matrix = np.zeros((len(repo.commits), len(repo.branches)), dtype=CLOCK_DTYPE)
+    else:
+        matrix = out
+        matrix.fill(0)
+    for i in topological_order(repo):
+        parents = repo.commit_parents[i]
+        if len(parents) == 1:
+            matrix[i] = matrix[parents[0]]
+        elif parents:
+            np.maximum.reduce(matrix[parents], axis=0, out=matrix[i])
+        matrix[i, repo.commit_branch[i]] += 1
+    return matrix
+
+
+def matrix_to_clocks(repo: InternedRepo, matrix: 'np.ndarray') -> CommitToClock:
+    return {c: row for c, row in zip(repo.commits, matrix.tolist())}
+
+
 def compute_vector_clocks(
     branch_to_index: BranchIndex,
     commit_to_branch: CommitToBranch,
     commit_to_parents: CommitToParents,
+    engine: str = 'python',
 ) -> CommitToClock:
-    num_processes = len(branch_to_index)
-    memo: CommitToClock = {}
-
-    def clock_of(commit: str) -> Clock:
-        if commit in memo:
-            return memo[commit]
-        branch = commit_to_branch[commit]
-        proc_index = branch_to_index[branch]
-        parents = commit_to_parents.get(commit, [])
-        if not parents:
-            v = [0] * num_processes
-            v[proc_index] += 1
-            memo[commit] = v
-            return v
-        parent_clocks = [clock_of(p) for p in parents]
-        v = elementwise_max(parent_clocks)
-        if len(v) == 0:
-            v = [0] * num_processes
-        v[proc_index] += 1
-        memo[commit] = v
-        return v
-
-    for commit in commit_to_branch.keys():
-        clock_of(commit)
-
-    return memo
+    repo = intern_repo(branch_to_index, commit_to_branch, commit_to_parents)
+    return compute_repo_clocks(repo, engine)
+
+
+def compute_repo_clocks(repo: InternedRepo, engine: str = 'python') -> CommitToClock:
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+    if engine == 'numpy':
+        return matrix_to_clocks(repo, compute_clock_matrix(repo))
+    if engine == 'sparse':
+        return compute_sparse_clocks(repo)
+    if engine == 'auto':
+        # Non-zero components only ever accumulate, so once the running count
+        # passes the threshold the result is known to be dense; the sparse attempt
+        # stops there and the clocks are built as dense lists instead. Clocks fill
+        # up late in topological order, so on dense repositories that can take most
+        # of a sparse pass; this is why 'auto' is not the default.
+        budget = SPARSE_DENSITY_THRESHOLD * len(repo.commits) * len(repo.branches)
+        sparse = compute_sparse_clocks(repo, max_nonzero=budget)
+        if sparse is not None:
+            return sparse
+
+    num_processes = len(repo.branches)
+    clocks: List[Clock] = [[] for _ in repo.commits]
+    for i in topological_order(repo):
+        parents = repo.commit_parents[i]
+        v = elementwise_max([clocks[p] for p in parents]) if parents else [0] * num_processes
+        v[repo.commit_branch[i]] += 1
+        clocks[i] = v
+    return dict(zip(repo.commits, clocks))
+
+
+def compute_sparse_clocks(repo: InternedRepo, max_nonzero: Optional[float] = None) -> Optional[CommitToClock]:
+    # Returns None as soon as the clocks hold max_nonzero or more non-zero
+    # components in total, i.e. when their density reaches max_nonzero / (commits * branches).
+    clocks: List[Optional[SparseClock]] = [None] * len(repo.commits)
+    nonzero = 0
+    for i in topological_order(repo):
+        v = sparse_max([clocks[p] for p in repo.commit_parents[i]])
+        v[repo.commit_branch[i]] += 1
+        clocks[i] = v
+        nonzero += len(v)
+        if max_nonzero is not None and nonzero >= max_nonzero:
+            return None
+    return dict(zip(repo.commits, clocks))
+
+
+def clock_density(clocks: CommitToClock, num_branches: int) -> float:
+    if not clocks or not num_branches:
+        return 1.0
+    nonzero = sum(len(v) if isinstance(v, SparseClock) else sum(1 for x in v if x) for v in clocks.values())
+    return nonzero / (len(clocks) * num_branches)
+
+
+def densify(clocks: CommitToClock, num_branches: int) -> CommitToClock:
+    return {c: to_dense(v, num_branches) for c, v in clocks.items()}
+
+
+def choose_representation(clocks: CommitToClock, num_branches: int, engine: str) -> CommitToClock:
+    # Applies the representation an engine would have produced to clocks obtained
+    # some other way (cache, incremental base), so outputs do not depend on the path.
+    if engine == 'sparse' or (engine == 'auto' and clock_density(clocks, num_branches) < SPARSE_DENSITY_THRESHOLD):
+        return {c: v if isinstance(v, SparseClock) else to_sparse(v) for c, v in clocks.items()}
+    return densify(clocks, num_branches)
+
+
+def extend_repo_clocks(repo: InternedRepo, base: CommitToClock) -> Tuple[CommitToClock, List[str]]:
+    # Clocks in `base` are frozen; only commits missing from it are computed, in
+    # Kahn order restricted to the new commits.
+    num_processes = len(repo.branches)
+    clocks: CommitToClock = {}
+    for c, v in base.items():
+        if len(v) > num_processes:
+            raise ValueError(f"base clock for {c!r} has {len(v)} components but the repository has {num_processes} branches")
+        clocks[c] = v + [0] * (num_processes - len(v)) if len(v) < num_processes else v
+
+    new = [i for i, c in enumerate(repo.commits) if c not in clocks]
+    pending = {i: 0 for i in new}
+    children: Dict[int, List[int]] = {}
+    for i in new:
+        for p in repo.commit_parents[i]:
+            if p in pending:
+                pending[i] += 1
+                children.setdefault(p, []).append(i)
+
+    ready = deque(i for i in new if pending[i] == 0)
+    added: List[str] = []
+    while ready:
+        i = ready.popleft()
+        parents = repo.commit_parents[i]
+        v = elementwise_max([clocks[repo.commits[p]] for p in parents]) if parents else [0] * num_processes
+        v[repo.commit_branch[i]] += 1
+        clocks[repo.commits[i]] = v
+        added.append(repo.commits[i])
+        for child in children.get(i, []):
+            pending[child] -= 1
+            if pending[child] == 0:
+                ready.append(child)
+
+    if len(added) != len(new):
+        stuck = sorted(repo.commits[i] for i in new if pending[i] > 0)
+        raise ValueError(f"commit graph has a cycle; {len(stuck)} new commits cannot be ordered: {', '.join(stuck[:10])}")
+    return clocks, added
 
 
 def causally_precedes(a: Clock, b: Clock) -> bool:
+    if COUNT_CALLS:
+        CALL_COUNTS['causally_precedes'] += 1
+    if isinstance(a, SparseClock) or isinstance(b, SparseClock):
+        return sparse_precedes(a if isinstance(a, SparseClock) else to_sparse(a),
+                               b if isinstance(b, SparseClock) else to_sparse(b))
     if len(a) != len(b):
         return False
     le_all = True
@@ -84,7 +418,119 @@ def causally_precedes(a: Clock, b: Clock) -> bool:
     return le_all and lt_any
 
 
-def build_causal_edges(commits: List[str], clocks: CommitToClock) -> Set[Tuple[str, str]]:
+# Every commit is an event of exactly one branch. When each branch is a chain,
+# u happened before v iff v has seen u's own component: clocks[v][k] >= clocks[u][k]
+# for k = owner[u]. Input JSON does not guarantee chains, so callers must run
+# check_chains first. Set FDS_CHECK_PRECEDENCE=1 to cross-check against the full vectors.
+def owner_components(commit_to_branch: CommitToBranch, branch_to_index: BranchIndex) -> CommitToComponent:
+    return {c: branch_to_index[b] for c, b in commit_to_branch.items()}
+
+
+def _not_a_chain(k: int, a: str, b: str, position: int) -> ValueError:
+    return ValueError(f"branch {k} is not a chain: commits {a!r} and {b!r} are both at position {position} "
+                      f"of its clock component, so neither happened before the other")
+
+
+def check_chains(commits: Iterable[str], clocks: CommitToClock, owner: CommitToComponent) -> None:
+    # A branch is a chain iff its commits have pairwise distinct own components:
+    # the commit at position t then descends from the one at t - 1.
+    seen: Dict[Tuple[int, int], str] = {}
+    for c in commits:
+        k = owner[c]
+        t = clocks[c][k]
+        first = seen.setdefault((k, t), c)
+        if first != c:
+            raise _not_a_chain(k, first, c, t)
+
+
+def happened_before(u: str, v: str, clocks: CommitToClock, owner: CommitToComponent) -> bool:
+    if COUNT_CALLS:
+        CALL_COUNTS['happened_before'] += 1
+    k = owner[u]
+    result = u != v and clocks[u][k] <= clocks[v][k]
+    if CHECK_PRECEDENCE:
+        assert result == causally_precedes(clocks[u], clocks[v]), f"precedence mismatch for {u} -> {v}"
+    return result
+
+
+def happened_before_batch(matrix: 'np.ndarray', commit_branch, us, vs) -> 'np.ndarray':
+    us = np.asarray(us, dtype=np.intp)
+    vs = np.asarray(vs, dtype=np.intp)
+    k = np.asarray(commit_branch, dtype=np.intp)[us]
+    result = (matrix[us, k] <= matrix[vs, k]) & (us != vs)
+    if CHECK_PRECEDENCE:
+        a, b = matrix[us], matrix[vs]
+        full = (a <= b).all(axis=1) & (a < b).any(axis=1)
+        assert (result == full).all(), 'precedence mismatch in batch'
+    return result
+
+
+class BranchChain(NamedTuple):
+    commits: List[str]
+    positions: List[int]
+
+
+def branch_chains(commits: List[str], clocks: CommitToClock, owner: CommitToComponent) -> Dict[int, BranchChain]:
+    members: Dict[int, List[str]] = {}
+    for c in commits:
+        members.setdefault(owner[c], []).append(c)
+    chains: Dict[int, BranchChain] = {}
+    for k, chain in members.items():
+        chain.sort(key=lambda c: clocks[c][k])
+        positions = [clocks[c][k] for c in chain]
+        # Every chain consumer bisects on positions, which must be strictly increasing.
+        for i in range(1, len(chain)):
+            if positions[i] == positions[i - 1]:
+                raise _not_a_chain(k, chain[i - 1], chain[i], positions[i])
+        chains[k] = BranchChain(chain, positions)
+    return chains
+
+
+def iter_causal_edges(
+    commits: List[str],
+    clocks: CommitToClock,
+    owner: CommitToComponent,
+) -> Iterator[Tuple[str, str]]:
+    # Chains are built (and validated) eagerly, before a caller starts writing.
+    return _causal_edges(commits, clocks, branch_chains(commits, clocks, owner))
+
+
+def _causal_edges(
+    commits: List[str],
+    clocks: CommitToClock,
+    chains: Dict[int, BranchChain],
+) -> Iterator[Tuple[str, str]]:
+    # The ancestors of v on branch k are the prefix of k's chain up to clocks[v][k],
+    # so the work done is proportional to the number of edges emitted.
+    for v in commits:
+        clock = clocks[v]
+        for k, chain in chains.items():
+            for u in chain.commits[:bisect_right(chain.positions, clock[k])]:
+                if u != v:
+                    yield (u, v)
+
+
+def count_causal_edges(
+    commits: List[str],
+    clocks: CommitToClock,
+    owner: CommitToComponent,
+) -> int:
+    chains = branch_chains(commits, clocks, owner)
+    total = 0
+    for v in commits:
+        clock = clocks[v]
+        for k, chain in chains.items():
+            total += bisect_right(chain.positions, clock[k])
+    return total - len(commits)
+
+
+def build_causal_edges(
+    commits: List[str],
+    clocks: CommitToClock,
+    owner: Optional[CommitToComponent] = None,
+) -> Set[Tuple[str, str]]:
+    if owner is not None:
+        return set(iter_causal_edges(commits, clocks, owner))
     edges: Set[Tuple[str, str]] = set()
     for i in range(len(commits)):
         u = commits[i]
@@ -97,57 +543,591 @@ def build_causal_edges(commits: List[str], clocks: CommitToClock) -> Set[Tuple[s
     return edges
 
 
-def transitive_reduction(commits: List[str], edges: Set[Tuple[str, str]], clocks: CommitToClock) -> Set[Tuple[str, str]]:
+def transitive_reduction(
+    commits: List[str],
+    edges: Set[Tuple[str, str]],
+    clocks: CommitToClock,
+    owner: Optional[CommitToComponent] = None,
+) -> Set[Tuple[str, str]]:
+    if owner is None:
+        precedes = lambda u, v: causally_precedes(clocks[u], clocks[v])
+    else:
+        check_chains(commits, clocks, owner)
+        precedes = lambda u, v: happened_before(u, v, clocks, owner)
     minimal = set(edges)
     for (u, v) in list(edges):
         for w in commits:
             if w == u or w == v:
                 continue
-            if causally_precedes(clocks[u], clocks[w]) and causally_precedes(clocks[w], clocks[v]):
+            if precedes(u, w) and precedes(w, v):
                 if (u, v) in minimal:
                     minimal.remove((u, v))
                 break
     return minimal
 
 
-def write_clocks_json(clocks: CommitToClock, out_path: str) -> None:
-    ordered = {k: clocks[k] for k in sorted(clocks.keys())}
+def iter_reduced_edges(
+    commits: List[str],
+    commit_to_parents: CommitToParents,
+    clocks: CommitToClock,
+    owner: CommitToComponent,
+) -> Iterator[Tuple[str, str]]:
+    # Validated eagerly, before a caller starts writing the generated edges.
+    check_chains(commits, clocks, owner)
+    return _reduced_edges(commits, commit_to_parents, clocks, owner)
+
+
+def _reduced_edges(
+    commits: List[str],
+    commit_to_parents: CommitToParents,
+    clocks: CommitToClock,
+    owner: CommitToComponent,
+) -> Iterator[Tuple[str, str]]:
+    # The Hasse diagram of the causal order is a subset of the parent edges: p -> v
+    # is redundant exactly when p already happened before another parent of v.
+    for v in commits:
+        parents = list(dict.fromkeys(commit_to_parents.get(v, [])))
+        for p in parents:
+            if not any(q != p and happened_before(p, q, clocks, owner) for q in parents):
+                yield (p, v)
+
+
+def reduce_parent_graph(
+    commits: List[str],
+    commit_to_parents: CommitToParents,
+    clocks: CommitToClock,
+    owner: CommitToComponent,
+) -> Set[Tuple[str, str]]:
+    return set(iter_reduced_edges(commits, commit_to_parents, clocks, owner))
+
+
+def load_clocks_json(path: str) -> CommitToClock:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_clocks_json(clocks: CommitToClock, out_path: str, num_branches: Optional[int] = None, dense: bool = True) -> None:
+    if dense:
+        if num_branches is None and any(isinstance(v, SparseClock) for v in clocks.values()):
+            raise ValueError('num_branches is required to write sparse clocks in dense form')
+        ordered = {k: to_dense(clocks[k], num_branches) for k in sorted(clocks.keys())}
+    else:
+        ordered = {k: sorted((v if isinstance(v, SparseClock) else to_sparse(v)).items()) for k, v in sorted(clocks.items())}
     with open(out_path, 'w') as f:
         json.dump(ordered, f, indent=2)
 
 
-def write_dot(commits: List[str], edges: Set[Tuple[str, str]], clocks: CommitToClock, out_path: str) -> None:
-    with open(out_path, 'w') as f:
-        f.write('digraph G {\n')
-        for c in commits:
-            label = f"{c}\\n{clocks[c]}"
-            f.write(f'  "{c}" [label="{label}"];\n')
-        for (u, v) in edges:
-            f.write(f'  "{u}" -> "{v}";\n')
-        f.write('}\n')
+def _write_chunked(f: TextIO, lines: Iterable[str]) -> None:
+    chunk: List[str] = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= WRITE_CHUNK_CHARS:
+            f.write(''.join(chunk))
+            chunk.clear()
+            size = 0
+    if chunk:
+        f.write(''.join(chunk))
+
+
+def _dot_edge(u: str, v: str) -> str:
+    return f'  "{u}" -> "{v}";\n'
+
+
+def _dot_lines(commits: List[str], edge_text: Iterable[str], clocks: CommitToClock,
+               num_branches: Optional[int]) -> Iterator[str]:
+    # Labels always show the dense clock, so the DOT text does not depend on the engine.
+    yield 'digraph G {\n'
+    for c in commits:
+        label = f"{c}\\n{to_dense(clocks[c], num_branches)}"
+        yield f'  "{c}" [label="{label}"];\n'
+    yield from edge_text
+    yield '}\n'
+
+
+def write_dot_text(
+    commits: List[str],
+    edge_text: Iterable[str],
+    clocks: CommitToClock,
+    out_path: str,
+    compress: Optional[bool] = None,
+    num_branches: Optional[int] = None,
+) -> None:
+    if num_branches is None and any(isinstance(v, SparseClock) for v in clocks.values()):
+        raise ValueError('num_branches is required to label sparse clocks')
+    if compress is None:
+        compress = out_path.endswith('.gz')
+    f = gzip.open(out_path, 'wt', compresslevel=6) if compress else open(out_path, 'w')
+    with f:
+        _write_chunked(f, _dot_lines(commits, edge_text, clocks, num_branches))
+
+
+def write_dot(
+    commits: List[str],
+    edges: Iterable[Tuple[str, str]],
+    clocks: CommitToClock,
+    out_path: str,
+    compress: Optional[bool] = None,
+    num_branches: Optional[int] = None,
+) -> None:
+    # `edges` may be a lazy generator; it is consumed once and never stored.
+    write_dot_text(commits, (_dot_edge(u, v) for (u, v) in edges), clocks, out_path, compress, num_branches)
+
+
+# Worker-side state for ParallelEdges; filled once per process by _attach_worker.
+_worker: Dict[str, object] = {}
+
+
+def _attach_worker(shm_name: str, shape: Tuple[int, int], names: List[str], order: List[int], owner: List[int],
+                   chains: List[Tuple[int, List[int], List[int]]], parents: List[List[int]]) -> None:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker.update(shm=shm, matrix=np.ndarray(shape, dtype=CLOCK_DTYPE, buffer=shm.buf),
+                   names=names, order=order, owner=owner, chains=chains, parents=parents)
+
+
+def _full_edge_text(bounds: Tuple[int, int]) -> str:
+    matrix, names, order, chains = _worker['matrix'], _worker['names'], _worker['order'], _worker['chains']
+    out: List[str] = []
+    for v in order[bounds[0]:bounds[1]]:
+        row = matrix[v].tolist()
+        for k, members, positions in chains:
+            for u in members[:bisect_right(positions, row[k])]:
+                if u != v:
+                    out.append(_dot_edge(names[u], names[v]))
+    return ''.join(out)
+
+
+def _reduced_edge_text(bounds: Tuple[int, int]) -> str:
+    matrix, names, order = _worker['matrix'], _worker['names'], _worker['order']
+    owner, parents = _worker['owner'], _worker['parents']
+    out: List[str] = []
+    for v in order[bounds[0]:bounds[1]]:
+        ps = parents[v]
+        for p in ps:
+            k = owner[p]
+            if not any(q != p and matrix[p, k] <= matrix[q, k] for q in ps):
+                out.append(_dot_edge(names[p], names[v]))
+    return ''.join(out)
+
+
+class ParallelEdges:
+    # Process-pool producer for the two edge phases. The clock matrix (rows in
+    # repo.commits order) is computed straight into shared memory; each task covers
+    # a contiguous slice of the commits in sorted order and returns its DOT lines.
+    # Results are consumed in task order, so the text is identical to the serial
+    # iter_causal_edges / iter_reduced_edges, and at most `window` tasks are in
+    # flight so a slow writer does not make finished text pile up.
+    def __init__(self, repo: InternedRepo, clocks: CommitToClock, workers: int, window: Optional[int] = None):
+        if np is None:
+            raise RuntimeError('parallel edge computation requires numpy')
+        self.repo = repo
+        self.workers = workers
+        self.window = window or 2 * workers
+        ordinal = {c: i for i, c in enumerate(repo.commits)}
+        commits = sorted(clocks)
+        owner = dict(zip(repo.commits, repo.commit_branch))
+        self._order = [ordinal[c] for c in commits]
+        self._chains = [(k, [ordinal[c] for c in chain.commits], chain.positions)
+                        for k, chain in branch_chains(commits, clocks, owner).items()]
+        self._parents = [list(dict.fromkeys(parents)) for parents in repo.commit_parents]
+        step = max(64, len(commits) // (workers * 8) or 1)
+        self._slices = [(lo, min(lo + step, len(commits))) for lo in range(0, len(commits), step)]
+        self._shm = None
+        self._pool = None
+
+    def __enter__(self) -> 'ParallelEdges':
+        shape = (len(self.repo.commits), len(self.repo.branches))
+        nbytes = shape[0] * shape[1] * np.dtype(CLOCK_DTYPE).itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        try:
+            compute_clock_matrix(self.repo, out=np.ndarray(shape, dtype=CLOCK_DTYPE, buffer=self._shm.buf))
+            self._pool = multiprocessing.get_context().Pool(
+                self.workers, initializer=_attach_worker,
+                initargs=(self._shm.name, shape, self.repo.commits, self._order, self.repo.commit_branch,
+                          self._chains, self._parents))
+        except BaseException:
+            self._shm.close()
+            self._shm.unlink()
+            raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._pool.close()
+        self._pool.join()
+        self._shm.close()
+        self._shm.unlink()
+
+    def _windowed(self, fn) -> Iterator[str]:
+        slices = iter(self._slices)
+        pending = deque(self._pool.apply_async(fn, (s,)) for s in islice(slices, self.window))
+        while pending:
+            text = pending.popleft().get()
+            nxt = next(slices, None)
+            if nxt is not None:
+                pending.append(self._pool.apply_async(fn, (nxt,)))
+            yield text
 
+    def full_edge_text(self) -> Iterator[str]:
+        return self._windowed(_full_edge_text)
 
-def main() -> None:
+    def reduced_edge_text(self) -> Iterator[str]:
+        return self._windowed(_reduced_edge_text)
+
+
+def _peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class PhaseProfiler:
+    # Opt-in per-phase wall/CPU time, memory and precedence call counts. The
+    # precedence functions count themselves while COUNT_CALLS is set, which covers
+    # callers that imported them by name; calls made inside --workers processes
+    # are not counted. ru_maxrss is a high-water mark for the whole process, so a
+    # phase reports how far it raised that mark, not its own peak.
+    COUNTED = ('causally_precedes', 'happened_before')
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = False, cprofile_dir: Optional[str] = None):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.cprofile_dir = cprofile_dir
+        self.phases: Dict[str, Dict[str, object]] = {}
+        self._calls_at_start: Counter = Counter()
+        self._was_counting = False
+
+    def __enter__(self) -> 'PhaseProfiler':
+        global COUNT_CALLS
+        if self.enabled:
+            self._was_counting = COUNT_CALLS
+            self._calls_at_start = Counter(CALL_COUNTS)
+            COUNT_CALLS = True
+            if self.trace_memory:
+                tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global COUNT_CALLS
+        if self.enabled:
+            COUNT_CALLS = self._was_counting
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        calls_before = Counter(CALL_COUNTS)
+        rss_before = _peak_rss_kb()
+        profile = cProfile.Profile() if self.cprofile_dir else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            record: Dict[str, object] = {
+                'wall_s': round(time.perf_counter() - wall, 6),
+                'cpu_s': round(time.process_time() - cpu, 6),
+            }
+            rss_after = _peak_rss_kb()
+            if rss_after is not None:
+                record['process_peak_rss_kb'] = rss_after
+                record['peak_rss_increase_kb'] = rss_after - rss_before
+            if self.trace_memory:
+                record['tracemalloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            record['calls'] = {k: CALL_COUNTS[k] - calls_before[k] for k in self.COUNTED}
+            if profile:
+                path = os.path.join(self.cprofile_dir, f'profile_{name}.prof')
+                profile.dump_stats(path)
+                record['cprofile'] = os.path.basename(path)
+            self.phases[name] = record
+
+    def report(self) -> Dict[str, object]:
+        return {
+            'phases': self.phases,
+            'total_wall_s': round(sum(p['wall_s'] for p in self.phases.values()), 6),
+            'process_peak_rss_kb': _peak_rss_kb(),
+            'calls': {k: CALL_COUNTS[k] - self._calls_at_start[k] for k in self.COUNTED},
+        }
+
+    def write(self, out_path: str) -> None:
+        with open(out_path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Compute vector clocks and causal graphs for a repository.')
+    parser.add_argument('--engine', choices=ENGINES, default='python',
+                        help="clock engine; 'numpy' keeps all clocks in one matrix, 'sparse' stores only non-zero "
+                             "components and 'auto' picks sparse or dense lists from the measured density, "
+                             "trading some time on dense repositories for memory on sparse ones")
+    parser.add_argument('--input', help='repository JSON (default: example.json next to this script)')
+    parser.add_argument('--out-dir', help='directory for the outputs (default: next to this script)')
+    parser.add_argument('--git', metavar='PATH',
+                        help='read the commit graph of a local git repository instead of a JSON file')
+    parser.add_argument('--stream', action='store_true',
+                        help='parse the input incrementally instead of loading the whole JSON tree')
+    parser.add_argument('--incremental', action='store_true',
+                        help='reuse the existing vector_clocks.json (or .bin) and only compute clocks for new commits')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='compute the causal graphs with N worker processes sharing the clock matrix')
+    parser.add_argument('--gzip', action='store_true',
+                        help='write the causal graphs gzip-compressed (causal_*.dot.gz)')
+    parser.add_argument('--binary', action='store_true',
+                        help='also write vector_clocks.bin, a memory-mappable clock matrix')
+    parser.add_argument('--only', default=None,
+                        help=f"comma separated artifacts to produce out of {','.join(ARTIFACTS)} "
+                             "(default: clocks,full,min plus bin with --binary)")
+    parser.add_argument('--checkpoint-every', type=int, default=64,
+                        help='for the delta artifact, store a full clock after this many delta links')
+    parser.add_argument('--cache-dir', help='stage result cache (default: .fds_cache in the output directory)')
+    parser.add_argument('--no-cache', action='store_true', help='neither read nor write the stage result cache')
+    parser.add_argument('--profile', action='store_true',
+                        help='record time, memory and precedence call counts per phase in profile.json')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='with --profile, also trace Python allocations (slower)')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='with --profile, dump a cProfile file per phase (profile_<phase>.prof)')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
     here = os.path.dirname(os.path.abspath(__file__))
-    json_path = os.path.join(here, 'example.json')
-    branch_to_index, commit_to_branch, commit_to_parents = load_repo(json_path)
+    json_path = args.input or os.path.join(here, 'example.json')
+    out_dir = args.out_dir or here
+    profiler = PhaseProfiler(args.profile, args.tracemalloc, out_dir if args.cprofile else None)
+    with profiler:
+        run(args, json_path, out_dir, profiler)
+    if args.profile:
+        profiler.write(os.path.join(out_dir, 'profile.json'))
+        print('Phase profile written to profile.json')
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Pipeline:
+    # Builds only the requested artifacts and everything they depend on, on demand:
+    # the repository is loaded and the clocks computed the first time an artifact
+    # needs them. Each artifact is cached under a hash of the input and the
+    # parameters that affect its bytes, so unchanged inputs are restored by copy.
+    def __init__(self, args: argparse.Namespace, json_path: str, out_dir: str, profiler: PhaseProfiler):
+        self.args = args
+        self.json_path = json_path
+        self.out_dir = out_dir
+        self.profiler = profiler
+        self.cache_dir = None if args.no_cache else (args.cache_dir or os.path.join(out_dir, '.fds_cache'))
+        self._repo: Optional[InternedRepo] = None
+        self._clocks: Optional[CommitToClock] = None
+        self._input_hash: Optional[str] = None
+        self._parallel: Optional[ParallelEdges] = None
+        self._stack = ExitStack()
+
+    def __enter__(self) -> 'Pipeline':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stack.close()
+
+    def output_name(self, artifact: str) -> str:
+        dot_suffix = '.dot.gz' if self.args.gzip else '.dot'
+        return {
+            'clocks': 'vector_clocks.json',
+            'bin': 'vector_clocks.bin',
+            'delta': 'vector_clocks.delta.json',
+            'full': 'causal_full' + dot_suffix,
+            'min': 'causal_min' + dot_suffix,
+            'branches': 'vector_clocks.branches.json',
+        }[artifact]
+
+    @property
+    def repo(self) -> InternedRepo:
+        if self._repo is None:
+            args = self.args
+            with self.profiler.phase('load_repo'):
+                if args.git:
+                    self._repo = InternedRepo(*load_git_history(args.git))
+                elif args.stream:
+                    self._repo = load_repo_stream(self.json_path)
+                else:
+                    self._repo = intern_repo(*load_repo(self.json_path))
+        return self._repo
+
+    @property
+    def clocks(self) -> CommitToClock:
+        if self._clocks is None:
+            cached = self._cached('clocks')
+            if cached:
+                with self.profiler.phase('load_cached_clocks'):
+                    self._clocks = choose_representation(load_clocks_json(cached), len(self.repo.branches),
+                                                         self.args.engine)
+            else:
+                with self.profiler.phase('compute_vector_clocks'):
+                    self._clocks = compute_repo_clocks(self.repo, engine=self.args.engine)
+        return self._clocks
+
+    def extend_clocks(self, base: CommitToClock) -> List[str]:
+        with self.profiler.phase('compute_vector_clocks'):
+            clocks, added = extend_repo_clocks(self.repo, base)
+            self._clocks = choose_representation(clocks, len(self.repo.branches), self.args.engine)
+        return added
+
+    def input_hash(self) -> str:
+        if self._input_hash is None:
+            if self.args.git:
+                source = json.dumps(branch_tips(self.args.git)).encode('utf-8')
+                self._input_hash = 'git:' + hashlib.sha256(source).hexdigest()
+            else:
+                self._input_hash = _sha256_file(self.json_path)
+        return self._input_hash
+
+    def _cache_path(self, artifact: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        params = {'artifact': artifact, 'name': self.output_name(artifact), 'version': CACHE_VERSION}
+        if artifact == 'delta':
+            params['checkpoint_every'] = self.args.checkpoint_every
+        key = hashlib.sha256(f'{self.input_hash()}\0{json.dumps(params, sort_keys=True)}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f'{key}-{self.output_name(artifact)}')
+
+    def _cached(self, artifact: str) -> Optional[str]:
+        path = self._cache_path(artifact)
+        return path if path and os.path.exists(path) else None
+
+    def _store(self, artifact: str, out_path: str) -> None:
+        path = self._cache_path(artifact)
+        if path is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        shutil.copyfile(out_path, tmp)
+        os.replace(tmp, path)
+
+    def _parallel_edges(self) -> ParallelEdges:
+        if self._parallel is None:
+            clocks = self.clocks
+            self._parallel = self._stack.enter_context(ParallelEdges(self.repo, clocks, self.args.workers))
+        return self._parallel
+
+    def build(self, artifact: str, use_cache: bool = True) -> bool:
+        # Returns True when the artifact was restored from the cache. The clock
+        # files do not name their components, so the branch order is written next
+        # to them for --incremental.
+        if artifact in ('clocks', 'bin'):
+            self.build('branches', use_cache)
+        out_path = os.path.join(self.out_dir, self.output_name(artifact))
+        cached = self._cached(artifact) if use_cache else None
+        if cached:
+            with self.profiler.phase(f'restore_{artifact}'):
+                shutil.copyfile(cached, out_path)
+            return True
+
+        clocks = self.clocks
+        repo = self.repo
+        commits = sorted(clocks)
+        owner = dict(zip(repo.commits, repo.commit_branch))
+        # Edges are produced lazily, so the full/min phases cover computing and writing one graph.
+        with self.profiler.phase(f'write_{artifact}'):
+            if artifact == 'branches':
+                with open(out_path, 'w') as f:
+                    json.dump(repo.branches, f)
+            elif artifact == 'clocks':
+                write_clocks_json(clocks, out_path, len(repo.branches))
+            elif artifact == 'bin':
+                write_clocks_bin(clocks, out_path, len(repo.branches))
+            elif artifact == 'delta':
+                write_clocks_delta(clocks, repo_parent_map(repo), out_path, len(repo.branches),
+                                   self.args.checkpoint_every)
+            elif self.args.workers > 1:
+                pool = self._parallel_edges()
+                edge_text = pool.full_edge_text() if artifact == 'full' else pool.reduced_edge_text()
+                write_dot_text(commits, edge_text, clocks, out_path, num_branches=len(repo.branches))
+            elif artifact == 'full':
+                write_dot(commits, iter_causal_edges(commits, clocks, owner), clocks, out_path,
+                          num_branches=len(repo.branches))
+            else:
+                write_dot(commits, iter_reduced_edges(commits, repo_parent_map(repo), clocks, owner), clocks, out_path,
+                          num_branches=len(repo.branches))
+        if use_cache:
+            self._store(artifact, out_path)
+        return False
+
+
+def load_base_branches(out_dir: str) -> Optional[List[str]]:
+    path = os.path.join(out_dir, 'vector_clocks.branches.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def base_matches(repo: InternedRepo, base: CommitToClock, base_branches: Optional[List[str]]) -> bool:
+    # Base clocks can only be extended when their components are a prefix of the
+    # current branch order and every base commit is still in the repository.
+    if base_branches is None or repo.branches[:len(base_branches)] != base_branches:
+        return False
+    if any(len(v) != len(base_branches) for v in base.values()):
+        return False
+    known = set(repo.commits)
+    return all(c in known for c in base)
+
 
-    clocks = compute_vector_clocks(branch_to_index, commit_to_branch, commit_to_parents)
-    commits = sorted(clocks.keys())
+def run(args: argparse.Namespace, json_path: str, out_dir: str, profiler: PhaseProfiler) -> None:
+    if args.only:
+        wanted = [a.strip() for a in args.only.split(',') if a.strip()]
+        unknown = sorted(set(wanted) - set(ARTIFACTS))
+        if unknown:
+            raise SystemExit(f"unknown artifacts {unknown}; choose from {','.join(ARTIFACTS)}")
+    else:
+        wanted = ['clocks'] + (['bin'] if args.binary else []) + ['full', 'min']
 
-    edges_full = build_causal_edges(commits, clocks)
-    edges_min = transitive_reduction(commits, edges_full, clocks)
+    with Pipeline(args, json_path, out_dir, profiler) as pipeline:
+        clocks_path = os.path.join(out_dir, 'vector_clocks.json')
+        bin_path = os.path.join(out_dir, 'vector_clocks.bin')
+        incremental = args.incremental and (os.path.exists(clocks_path) or os.path.exists(bin_path))
+        if incremental:
+            base = load_clocks_json(clocks_path) if os.path.exists(clocks_path) else load_clocks_bin(bin_path)
+            incremental = base_matches(pipeline.repo, base, load_base_branches(out_dir))
+            if not incremental:
+                print('Branches or commits changed since the last run; recomputing all clocks')
+        if incremental:
+            added = pipeline.extend_clocks(base)
+            print('New commits:', len(added))
+            if not added and all(os.path.exists(os.path.join(out_dir, pipeline.output_name(a))) for a in wanted):
+                print('Outputs are up to date')
+                return
 
-    write_clocks_json(clocks, os.path.join(here, 'vector_clocks.json'))
-    write_dot(commits, edges_full, clocks, os.path.join(here, 'causal_full.dot'))
-    write_dot(commits, edges_min, clocks, os.path.join(here, 'causal_min.dot'))
+        # The cache is keyed on the whole input, which an incremental base does not cover.
+        restored = {a: pipeline.build(a, use_cache=not incremental) for a in wanted}
 
-    print('Branches:', list(branch_to_index.keys()))
-    print('Processes:', len(branch_to_index))
-    print('Commits:', len(commits))
-    print('Vector clocks written to vector_clocks.json')
-    print('Full causal graph written to causal_full.dot')
-    print('Minimal causal graph written to causal_min.dot')
+        if pipeline._repo is not None:
+            print('Branches:', pipeline.repo.branches)
+            print('Processes:', len(pipeline.repo.branches))
+            print('Commits:', len(pipeline.repo.commits))
+        labels = {
+            'clocks': 'Vector clocks',
+            'bin': 'Binary clock store',
+            'delta': 'Delta-encoded clocks',
+            'full': 'Full causal graph',
+            'min': 'Minimal causal graph',
+        }
+        for artifact in wanted:
+            how = 'restored from cache to' if restored[artifact] else 'written to'
+            print(labels[artifact], how, pipeline.output_name(artifact))
 
 
 if __name__ == '__main__':
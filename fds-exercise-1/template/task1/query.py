@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import sys
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Optional, TextIO
+
+from clockstore import load_clocks_bin
+from main import (
+    CommitToClock,
+    CommitToComponent,
+    InternedRepo,
+    branch_chains,
+    compute_repo_clocks,
+    happened_before,
+    intern_repo,
+    load_clocks_json,
+    load_repo,
+    load_repo_stream,
+)
+
+
+class CausalIndex:
+    # Per-branch chains sorted by their own component. Along any chain the value of
+    # every other component is non-decreasing, so ancestors of c on a chain form a
+    # prefix and descendants a suffix; both ends are found by bisection.
+    def __init__(self, clocks: CommitToClock, owner: CommitToComponent):
+        self.clocks = clocks
+        self.owner = owner
+        self.chains = branch_chains(sorted(clocks), clocks, owner)
+
+    @classmethod
+    def from_repo(cls, repo: InternedRepo, clocks: Optional[CommitToClock] = None, engine: str = 'python') -> 'CausalIndex':
+        if clocks is None:
+            clocks = compute_repo_clocks(repo, engine)
+        return cls(clocks, dict(zip(repo.commits, repo.commit_branch)))
+
+    def __contains__(self, commit: str) -> bool:
+        return commit in self.clocks
+
+    def _bounds(self, c: str, k: int):
+        # (end of c's ancestors, start of c's descendants) on chain k, both inclusive of c itself
+        chain = self.chains[k]
+        p = self.owner[c]
+        clocks = self.clocks
+        anc_end = bisect_right(chain.positions, clocks[c][k])
+        desc_start = bisect_left(chain.commits, clocks[c][p], lo=anc_end if k != p else 0,
+                                 key=lambda x: clocks[x][p])
+        return anc_end, desc_start
+
+    def precedes(self, a: str, b: str) -> bool:
+        return happened_before(a, b, self.clocks, self.owner)
+
+    def concurrent(self, a: str, b: str) -> bool:
+        return a != b and not self.precedes(a, b) and not self.precedes(b, a)
+
+    def ancestors(self, c: str) -> Iterator[str]:
+        clock = self.clocks[c]
+        for k, chain in self.chains.items():
+            for x in chain.commits[:bisect_right(chain.positions, clock[k])]:
+                if x != c:
+                    yield x
+
+    def descendants(self, c: str) -> Iterator[str]:
+        for k, chain in self.chains.items():
+            _, start = self._bounds(c, k)
+            for x in chain.commits[start:]:
+                if x != c:
+                    yield x
+
+    def concurrent_with(self, c: str) -> Iterator[str]:
+        for k, chain in self.chains.items():
+            if k == self.owner[c]:
+                continue
+            end, start = self._bounds(c, k)
+            yield from chain.commits[end:start]
+
+    def _common_prefixes(self, commits: List[str]) -> Dict[int, int]:
+        # Element-wise minimum of the clocks: a commit on chain k is a common
+        # ancestor (inclusive) of all `commits` iff its own position is <= m[k].
+        clocks = [self.clocks[c] for c in commits]
+        return {k: bisect_right(chain.positions, min(clock[k] for clock in clocks))
+                for k, chain in self.chains.items()}
+
+    def common_ancestors(self, *commits: str) -> Iterator[str]:
+        for k, end in self._common_prefixes(list(commits)).items():
+            yield from self.chains[k].commits[:end]
+
+    def merge_bases(self, *commits: str) -> List[str]:
+        # Only the last common ancestor on each chain can be maximal; of those, drop
+        # the ones another candidate has already seen.
+        if not commits:
+            return []
+        candidates = [self.chains[k].commits[end - 1] for k, end in self._common_prefixes(list(commits)).items() if end]
+        return sorted(x for x in candidates
+                      if not any(y != x and self.precedes(x, y) for y in candidates))
+
+    def count_concurrent(self, c: str) -> int:
+        total = 0
+        for k in self.chains:
+            if k != self.owner[c]:
+                end, start = self._bounds(c, k)
+                total += start - end
+        return total
+
+
+# query name -> (minimum, maximum) number of commits; None means unbounded
+QUERIES = {
+    'precedes': (2, 2),
+    'concurrent': (1, 2),
+    'ancestors': (1, 1),
+    'descendants': (1, 1),
+    'merge-base': (2, None),
+}
+
+
+def answer(index: CausalIndex, op: str, args: List[str]):
+    unknown = [c for c in args if c not in index]
+    if unknown:
+        raise KeyError(f"unknown commits: {', '.join(unknown)}")
+    if op == 'precedes':
+        return index.precedes(*args)
+    if op == 'concurrent':
+        return index.concurrent(*args) if len(args) == 2 else sorted(index.concurrent_with(args[0]))
+    if op == 'ancestors':
+        return sorted(index.ancestors(args[0]))
+    if op == 'merge-base':
+        return index.merge_bases(*args)
+    return sorted(index.descendants(args[0]))
+
+
+def run_batch(index: CausalIndex, lines: TextIO, out: TextIO) -> None:
+    for line in lines:
+        parts = line.split()
+        if not parts or parts[0].startswith('#'):
+            continue
+        op, args = parts[0], parts[1:]
+        record: Dict[str, object] = {'query': op, 'args': args}
+        arity = QUERIES.get(op)
+        if arity is None:
+            record['error'] = f"unknown query, expected one of {sorted(QUERIES)}"
+        elif len(args) < arity[0] or (arity[1] is not None and len(args) > arity[1]):
+            lo, hi = arity
+            count = f'{lo}' if lo == hi else f'{lo} or more' if hi is None else f'{lo} or {hi}' if hi == lo + 1 else f'{lo} to {hi}'
+            record['error'] = f'{op} takes {count} commit(s)'
+        else:
+            try:
+                record['result'] = answer(index, op, args)
+            except KeyError as e:
+                record['error'] = e.args[0]
+        out.write(json.dumps(record) + '\n')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Answer causality queries read from stdin, one per line: '
+                    'precedes A B | concurrent A [B] | ancestors A | descendants A | merge-base A B [C ...]')
+    parser.add_argument('--input', help='repository JSON (default: example.json next to this script)')
+    parser.add_argument('--clocks', help='reuse a vector_clocks.json or .bin instead of recomputing the clocks')
+    parser.add_argument('--stream', action='store_true', help='parse the repository JSON incrementally')
+    args = parser.parse_args(argv)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    json_path = args.input or os.path.join(here, 'example.json')
+    repo = load_repo_stream(json_path) if args.stream else intern_repo(*load_repo(json_path))
+    clocks = None
+    if args.clocks:
+        clocks = load_clocks_bin(args.clocks) if args.clocks.endswith('.bin') else load_clocks_json(args.clocks)
+    run_batch(CausalIndex.from_repo(repo, clocks), sys.stdin, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import random
+from typing import Dict, List, Optional
+
+Repo = Dict[str, Dict[str, List[str]]]
+
+
+def generate_repo(
+    branches: int,
+    depth: int,
+    merge_prob: float = 0.1,
+    fan_in: int = 2,
+    seed: int = 0,
+) -> Repo:
+    # Every branch is a chain: its first commit forks from a commit that already
+    # exists (or is a root for the first branch) and each later commit has the
+    # branch tip as first parent. With probability merge_prob a commit also merges
+    # the tips of up to fan_in - 1 other branches.
+    if branches < 1 or depth < 0 or fan_in < 1:
+        raise ValueError('need branches >= 1, depth >= 0 and fan_in >= 1')
+    rnd = random.Random(seed)
+    names = [f'b{i}' for i in range(branches)]
+    repo: Repo = {name: {} for name in names}
+    tips: Dict[str, str] = {}
+    made: List[str] = []
+    seen = set()
+
+    for _ in range(depth):
+        for name in rnd.sample(names, len(names)):
+            commit = f'{rnd.getrandbits(48):012x}'
+            while commit in seen:
+                commit = f'{rnd.getrandbits(48):012x}'
+            seen.add(commit)
+            if name in tips:
+                parents = [tips[name]]
+            elif made:
+                parents = [rnd.choice(made)]
+            else:
+                parents = []
+            others = [tips[o] for o in tips if o != name and tips[o] not in parents]
+            if others and fan_in > 1 and rnd.random() < merge_prob:
+                parents += rnd.sample(others, min(len(others), rnd.randint(1, fan_in - 1)))
+            repo[name][commit] = parents
+            tips[name] = commit
+            made.append(commit)
+    return repo
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Generate a synthetic {branch: {commit: [parents]}} repository.')
+    parser.add_argument('out_path')
+    parser.add_argument('--branches', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=100, help='commits per branch')
+    parser.add_argument('--merge-prob', type=float, default=0.1)
+    parser.add_argument('--fan-in', type=int, default=2, help='maximum number of parents of a merge commit')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    repo = generate_repo(args.branches, args.depth, args.merge_prob, args.fan_in, args.seed)
+    with open(args.out_path, 'w') as f:
+        json.dump(repo, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -59,6 +59,11 @@ class DBStub(object):
                 request_serializer=dservice__pb2.Passcode.SerializeToString,
                 response_deserializer=dservice__pb2.Data.FromString,
                 _registered_method=True)
+        self.GetAuthDataStream = channel.unary_stream(
+                '/DATA.DB/GetAuthDataStream',
+                request_serializer=dservice__pb2.Passcode.SerializeToString,
+                response_deserializer=dservice__pb2.Chunk.FromString,
+                _registered_method=True)
 
 
 class DBServicer(object):
@@ -94,6 +99,12 @@ class DBServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetAuthDataStream(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_DBServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -122,6 +133,11 @@ def add_DBServicer_to_server(servicer, server):
                     request_deserializer=dservice__pb2.Passcode.FromString,
                     response_serializer=dservice__pb2.Data.SerializeToString,
             ),
+            'GetAuthDataStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.GetAuthDataStream,
+                    request_deserializer=dservice__pb2.Passcode.FromString,
+                    response_serializer=dservice__pb2.Chunk.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'DATA.DB', rpc_method_handlers)
@@ -267,3 +283,30 @@ class DB(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GetAuthDataStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/DATA.DB/GetAuthDataStream',
+            dservice__pb2.Passcode.SerializeToString,
+            dservice__pb2.Chunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0ehservice.proto\x12\x04Hash\"\x18\n\x08Response\x12\x0c\n\x04hash\x18\x01 \x01(\t\"5\n\x07Request\x12\x10\n\x08passcode\x18\x01 \x01(\t\x12\n\n\x02ip\x18\x02 \x01(\t\x12\x0c\n\x04port\x18\x03 \x01(\r2.\n\x02HS\x12(\n\x07GetHash\x12\r.Hash.Request\x1a\x0e.Hash.Responseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0ehservice.proto\x12\x04Hash\"\x18\n\x08Response\x12\x0c\n\x04hash\x18\x01 \x01(\t\"5\n\x07Request\x12\x10\n\x08passcode\x18\x01 \x01(\t\x12\n\n\x02ip\x18\x02 \x01(\t\x12\x0c\n\x04port\x18\x03 \x01(\r\"/\n\x0c\x42\x61tchRequest\x12\x1f\n\x08requests\x18\x01 \x03(\x0b\x32\r.Hash.Request\"2\n\rBatchResponse\x12!\n\tresponses\x18\x01 \x03(\x0b\x32\x0e.Hash.Response2g\n\x02HS\x12(\n\x07GetHash\x12\r.Hash.Request\x1a\x0e.Hash.Response\x12\x37\n\x0cGetHashBatch\x12\x12.Hash.BatchRequest\x1a\x13.Hash.BatchResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,6 +35,10 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_RESPONSE']._serialized_end=48
   _globals['_REQUEST']._serialized_start=50
   _globals['_REQUEST']._serialized_end=103
-  _globals['_HS']._serialized_start=105
-  _globals['_HS']._serialized_end=151
+  _globals['_BATCHREQUEST']._serialized_start=105
+  _globals['_BATCHREQUEST']._serialized_end=152
+  _globals['_BATCHRESPONSE']._serialized_start=154
+  _globals['_BATCHRESPONSE']._serialized_end=204
+  _globals['_HS']._serialized_start=206
+  _globals['_HS']._serialized_end=309
 # @@protoc_insertion_point(module_scope)
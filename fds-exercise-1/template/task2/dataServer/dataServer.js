@@ -74,9 +74,31 @@ function getAuthData(call, callback) {
     }
 }
 
+// Streaming variant of getAuthData: the UTF-8 encoded data is sent in chunks of
+// CHUNK_SIZE bytes, so large messages stay under the per-message size limit.
+const CHUNK_SIZE = 64 * 1024;
+
+function getAuthDataStream(call) {
+    const { code } = call.request;
+
+    const user = Object.values(users).find(u => u.passcode === code);
+    if (user) {
+        user.passcode = null;
+        const data = Buffer.from(user.data || '', 'utf8');
+        for (let start = 0; start < data.length; start += CHUNK_SIZE) {
+            call.write({ data: data.subarray(start, start + CHUNK_SIZE) });
+        }
+    }
+    call.end(); // Invalid passcode: no chunks, same digest as an empty msg
+}
+
+// Largest request accepted (storeData carries the whole message); grpc-js
+// would otherwise reject anything over 4 MB with RESOURCE_EXHAUSTED.
+const MAX_MESSAGE_BYTES = 64 * 1024 * 1024;
+
 // Main function to set up the server
 function main() {
-    const server = new grpc.Server();
+    const server = new grpc.Server({ 'grpc.max_receive_message_length': MAX_MESSAGE_BYTES });
 
     // Register the service methods
     server.addService(dataProto.DB.service, {
@@ -85,6 +107,7 @@ function main() {
         GenPasscode: genPasscode,
         GetData: getData,
         GetAuthData: getAuthData,
+        GetAuthDataStream: getAuthDataStream,
     });
 
     const PORT = '0.0.0.0:50051';
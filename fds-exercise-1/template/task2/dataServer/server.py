@@ -0,0 +1,245 @@
+import argparse
+import heapq
+import secrets
+import string
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import grpc
+
+import dservice_pb2
+import dservice_pb2_grpc
+from storage import Storage
+
+CHUNK_SIZE = 64 * 1024
+# Largest request accepted (StoreData carries the whole message); gRPC's own
+# default of 4 MB would reject bigger messages with RESOURCE_EXHAUSTED.
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+PASSCODE_ALPHABET = string.ascii_lowercase + string.digits
+
+
+class User:
+    __slots__ = ('password', 'data', 'passcode')
+
+    def __init__(self, password: str, data: Optional[str] = None, passcode: Optional[str] = None):
+        self.password = password
+        self.data = data
+        self.passcode = passcode
+
+
+class UserStore:
+    # Same semantics as dataServer.js, plus a passcode -> username index so that
+    # redeeming a passcode is a dict lookup instead of a scan over all users.
+    # Passcodes expire passcode_ttl seconds after they are issued (never if the TTL
+    # is 0). Expiry times sit in a min-heap that is drained lazily on every call;
+    # heap entries for passcodes that were redeemed or replaced are skipped.
+    def __init__(self, passcode_ttl: float = 300.0, clock=time.monotonic):
+        self.passcode_ttl = passcode_ttl
+        self.clock = clock
+        self.users: Dict[str, User] = {}
+        self.passcodes: Dict[str, Tuple[str, float]] = {}  # code -> (username, expires at)
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _check(self, username: str, password: str) -> Optional[User]:
+        user = self.users.get(username)
+        return user if user is not None and user.password == password else None
+
+    def _expire(self, now: float) -> None:
+        heap = self._expiry
+        while heap and heap[0][0] <= now:
+            expires, code = heapq.heappop(heap)
+            entry = self.passcodes.get(code)
+            if entry is not None and entry[1] == expires:
+                del self.passcodes[code]
+                self.users[entry[0]].passcode = None
+        if len(heap) > 2 * len(self.passcodes) + 64:
+            # mostly stale entries: rebuild from the live passcodes
+            self._expiry = [e for e in heap if self.passcodes.get(e[1], (None, None))[1] == e[0]]
+            heapq.heapify(self._expiry)
+
+    def _drop_passcode(self, user: User) -> None:
+        if user.passcode is not None:
+            self.passcodes.pop(user.passcode, None)
+            user.passcode = None
+
+    def register(self, username: str, password: str) -> bool:
+        with self._lock:
+            if username in self.users:
+                return False
+            self.users[username] = User(password)
+            return True
+
+    def store(self, username: str, password: str, msg: str) -> bool:
+        with self._lock:
+            user = self._check(username, password)
+            if user is None:
+                return False
+            user.data = msg
+            return True
+
+    def gen_passcode(self, username: str, password: str) -> str:
+        with self._lock:
+            self._expire(self.clock())
+            user = self._check(username, password)
+            if user is None:
+                return ''
+            self._drop_passcode(user)
+            code = ''.join(secrets.choice(PASSCODE_ALPHABET) for _ in range(8))
+            while code in self.passcodes:
+                code = ''.join(secrets.choice(PASSCODE_ALPHABET) for _ in range(8))
+            user.passcode = code
+            expires = self.clock() + self.passcode_ttl if self.passcode_ttl > 0 else float('inf')
+            self.passcodes[code] = (username, expires)
+            if self.passcode_ttl > 0:
+                heapq.heappush(self._expiry, (expires, code))
+            return code
+
+    def get_data(self, username: str, password: str) -> Optional[str]:
+        with self._lock:
+            user = self._check(username, password)
+            return user.data if user is not None else None
+
+    def redeem(self, code: str) -> Optional[str]:
+        # A passcode is single use; unknown or expired codes give None.
+        with self._lock:
+            self._expire(self.clock())
+            entry = self.passcodes.pop(code, None)
+            if entry is None:
+                return None
+            user = self.users[entry[0]]
+            user.passcode = None
+            return user.data or ''
+
+
+class DurableUserStore(UserStore):
+    # Users and their data survive restarts; passcodes do not. RegisterUser and
+    # StoreData are logged while the store lock is held, so the log order matches
+    # the order the changes were applied. They return only after their record is
+    # fsynced. Waiting happens outside the lock, so concurrent writers share fsyncs.
+    # Until then each change keeps an undo step; if the fsync fails, that change and
+    # every later one (a failed log accepts nothing more) are undone newest first.
+    def __init__(self, storage: Storage, passcode_ttl: float = 300.0):
+        super().__init__(passcode_ttl)
+        self.storage = storage
+        self._undo: Deque[Tuple[int, Callable[[], None]]] = deque()  # in log order
+        for username, (password, data) in storage.recover().items():
+            self.users[username] = User(password, data)
+        storage.start(self.snapshot)
+
+    def register(self, username: str, password: str) -> bool:
+        with self._lock:
+            if username in self.users:
+                return False
+            seq = self.storage.log_register(username, password)
+            user = self.users[username] = User(password)
+
+            def undo():
+                self._drop_passcode(user)
+                del self.users[username]
+            self._undo.append((seq, undo))
+        self._commit(seq)
+        return True
+
+    def store(self, username: str, password: str, msg: str) -> bool:
+        with self._lock:
+            user = self._check(username, password)
+            if user is None:
+                return False
+            seq = self.storage.log_store(username, msg)
+            previous, user.data = user.data, msg
+
+            def undo():
+                user.data = previous
+            self._undo.append((seq, undo))
+        self._commit(seq)
+        return True
+
+    def _commit(self, seq: int) -> None:
+        try:
+            self.storage.wait(seq)
+        except OSError:
+            with self._lock:
+                while self._undo and self._undo[-1][0] >= seq:
+                    self._undo.pop()[1]()
+            raise
+        with self._lock:
+            while self._undo and self._undo[0][0] <= seq:
+                self._undo.popleft()
+
+    def snapshot(self) -> None:
+        with self._lock:
+            gen = self.storage.rotate()
+            rows = [(username, user.password, user.data) for username, user in self.users.items()]
+        self.storage.write_snapshot(gen, rows)
+
+    def close(self) -> None:
+        self.storage.close()
+
+
+class DataServer(dservice_pb2_grpc.DBServicer):
+    def __init__(self, store: UserStore = None):
+        self.store = store if store is not None else UserStore()
+
+    def RegisterUser(self, request, context):
+        ok = self.store.register(request.username, request.password)
+        if ok:
+            print(f"A user is defined (username:{request.username})")
+        return dservice_pb2.Result(success=ok)
+
+    def StoreData(self, request, context):
+        return dservice_pb2.Result(success=self.store.store(request.username, request.password, request.msg))
+
+    def GenPasscode(self, request, context):
+        return dservice_pb2.Passcode(code=self.store.gen_passcode(request.username, request.password))
+
+    def GetData(self, request, context):
+        return dservice_pb2.Data(msg=self.store.get_data(request.username, request.password) or '')
+
+    def GetAuthData(self, request, context):
+        return dservice_pb2.Data(msg=self.store.redeem(request.code) or '')
+
+    def GetAuthDataStream(self, request, context):
+        data = (self.store.redeem(request.code) or '').encode('utf-8')
+        for start in range(0, len(data), CHUNK_SIZE):
+            yield dservice_pb2.Chunk(data=data[start:start + CHUNK_SIZE])
+
+
+def serve(port: int = 50051, passcode_ttl: float = 300.0, data_dir: Optional[str] = None,
+          snapshot_every: int = 10000, snapshot_interval: float = 60.0,
+          max_message_bytes: int = MAX_MESSAGE_BYTES):
+    if data_dir:
+        store = DurableUserStore(Storage(data_dir, snapshot_every, snapshot_interval), passcode_ttl)
+    else:
+        store = UserStore(passcode_ttl)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10),
+                         options=[('grpc.max_receive_message_length', max_message_bytes)])
+    dservice_pb2_grpc.add_DBServicer_to_server(DataServer(store), server)
+    server.add_insecure_port(f"0.0.0.0:{port}")
+    server.start()
+    print(f"Data server listening on port {port}")
+    try:
+        server.wait_for_termination()
+    finally:
+        if data_dir:
+            store.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Python implementation of the DB service (drop-in for dataServer.js).')
+    parser.add_argument('--port', type=int, default=50051)
+    parser.add_argument('--passcode-ttl', type=float, default=300.0,
+                        help='seconds until an unused passcode expires; 0 keeps passcodes forever')
+    parser.add_argument('--data-dir', help='persist users and data here (default: keep everything in memory)')
+    parser.add_argument('--snapshot-every', type=int, default=10000,
+                        help='snapshot after this many logged changes')
+    parser.add_argument('--snapshot-interval', type=float, default=60.0,
+                        help='seconds between snapshots while there are unsnapshotted changes')
+    parser.add_argument('--max-message-bytes', type=int, default=MAX_MESSAGE_BYTES,
+                        help='largest request accepted, e.g. the message of a StoreData call')
+    args = parser.parse_args()
+    serve(args.port, args.passcode_ttl, args.data_dir, args.snapshot_every, args.snapshot_interval,
+          args.max_message_bytes)
@@ -0,0 +1,346 @@
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Data directory layout. Generation g is the pair
+#   snapshot.<g>  every user as of the start of log.<g> (absent for g = 0)
+#   log.<g>       records appended after that snapshot
+# Recovery loads the newest snapshot and replays only the log segments from its
+# generation on. Older files are deleted once a newer snapshot is durable.
+#
+# Log record: frame '<II' (payload length, crc32 of payload), then payload = one
+# kind byte and length-prefixed UTF-8 fields. A torn or corrupt tail (crash during
+# a write) ends the log and is truncated away. Only the newest segment can have
+# one: older segments were complete before the next was started, so a bad record
+# there is corruption and recovery refuses to continue.
+#
+# Snapshot: header '<4sHxxQI' (magic, version, n_users, crc32 of body), then per
+# user '<III' field lengths followed by username, password and data. NONE as a
+# length marks a user who never stored data.
+FRAME = struct.Struct('<II')
+FIELD = struct.Struct('<I')
+NONE = 0xFFFFFFFF
+REGISTER = 1
+STORE = 2
+
+SNAPSHOT_MAGIC = b'DSNP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sHxxQI')
+ROW = struct.Struct('<III')
+
+FILE_RE = re.compile(r'^(log|snapshot)\.(\d+)$')
+
+# username -> [password, data]
+State = Dict[str, List[Optional[str]]]
+
+
+def _encode(kind: int, *fields: Optional[str]) -> bytes:
+    parts = [bytes((kind,))]
+    for field in fields:
+        if field is None:
+            parts.append(FIELD.pack(NONE))
+        else:
+            raw = field.encode('utf-8')
+            parts.append(FIELD.pack(len(raw)))
+            parts.append(raw)
+    return b''.join(parts)
+
+
+def _decode(payload: bytes) -> Tuple[int, List[Optional[str]]]:
+    kind, pos, fields = payload[0], 1, []
+    while pos < len(payload):
+        (n,) = FIELD.unpack_from(payload, pos)
+        pos += FIELD.size
+        if n == NONE:
+            fields.append(None)
+        else:
+            fields.append(payload[pos:pos + n].decode('utf-8'))
+            pos += n
+    return kind, fields
+
+
+def _apply(state: State, kind: int, fields: List[Optional[str]]) -> None:
+    if kind == REGISTER:
+        username, password = fields
+        state.setdefault(username, [password, None])
+    elif kind == STORE:
+        username, msg = fields
+        if username in state:
+            state[username][1] = msg
+    else:
+        raise ValueError(f'unknown log record kind {kind}')
+
+
+def replay_log(path: str, state: State) -> Tuple[int, int]:
+    # Applies every intact record; returns (records applied, end of the last one).
+    with open(path, 'rb') as f:
+        buf = f.read()
+    pos = count = 0
+    while pos + FRAME.size <= len(buf):
+        n, crc = FRAME.unpack_from(buf, pos)
+        payload = buf[pos + FRAME.size:pos + FRAME.size + n]
+        if n == 0 or len(payload) < n or zlib.crc32(payload) != crc:
+            break
+        kind, fields = _decode(payload)
+        _apply(state, kind, fields)
+        pos += FRAME.size + n
+        count += 1
+    return count, pos
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(path: str, rows: Iterable[Tuple[str, str, Optional[str]]]) -> None:
+    # Written to path + '.tmp', fsynced and renamed, so a snapshot is never partial.
+    body = []
+    count = 0
+    for username, password, data in rows:
+        u, p = username.encode('utf-8'), password.encode('utf-8')
+        d = data.encode('utf-8') if data is not None else b''
+        body.append(ROW.pack(len(u), len(p), len(d) if data is not None else NONE))
+        body.append(u + p + d)
+        count += 1
+    body = b''.join(body)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, count, zlib.crc32(body)))
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+def read_snapshot(path: str) -> State:
+    # The file is mapped rather than read, and fields are decoded straight out of
+    # the mapping.
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if len(mm) < SNAPSHOT_HEADER.size:
+            raise ValueError(f'{path}: truncated snapshot')
+        magic, version, count, crc = SNAPSHOT_HEADER.unpack_from(mm, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f'{path}: not a version {SNAPSHOT_VERSION} snapshot')
+        view = memoryview(mm)
+        try:
+            if zlib.crc32(view[SNAPSHOT_HEADER.size:]) != crc:
+                raise ValueError(f'{path}: snapshot checksum mismatch')
+            state: State = {}
+            pos = SNAPSHOT_HEADER.size
+            for _ in range(count):
+                nu, np_, nd = ROW.unpack_from(mm, pos)
+                pos += ROW.size
+                username = str(view[pos:pos + nu], 'utf-8')
+                pos += nu
+                password = str(view[pos:pos + np_], 'utf-8')
+                pos += np_
+                data = None
+                if nd != NONE:
+                    data = str(view[pos:pos + nd], 'utf-8')
+                    pos += nd
+                state[username] = [password, data]
+        finally:
+            view.release()
+    return state
+
+
+class LogWriter:
+    # Group commit: appends are queued and a single flusher thread writes whatever
+    # has accumulated with one write and one fsync. Records that arrive while an
+    # fsync is running are committed together by the next one. append() returns a
+    # sequence number and wait(seq) blocks until that record is durable.
+    def __init__(self, path: str):
+        self._file = open(path, 'ab')
+        self._cond = threading.Condition()
+        self._pending: List[bytes] = []
+        self._appended = 0
+        self._durable = 0
+        self._error: Optional[OSError] = None
+        self._closed = False
+        self.fsyncs = 0
+        self._thread = threading.Thread(target=self._run, name='log-flusher', daemon=True)
+        self._thread.start()
+
+    def append(self, payload: bytes) -> int:
+        frame = FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('log is closed')
+            if self._error is not None:
+                raise self._error
+            self._pending.append(frame)
+            self._appended += 1
+            self._cond.notify_all()
+            return self._appended
+
+    def wait(self, seq: int) -> None:
+        with self._cond:
+            while self._durable < seq and self._error is None:
+                self._cond.wait()
+            if self._durable < seq:
+                raise self._error
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                upto = self._appended
+                f = self._file
+            try:
+                f.write(b''.join(batch))
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._durable = upto
+                self.fsyncs += 1
+                self._cond.notify_all()
+
+    def _drain(self) -> None:
+        # caller holds the condition
+        while (self._pending or self._durable < self._appended) and self._error is None:
+            self._cond.wait()
+        if self._error is not None:
+            raise self._error
+
+    def switch(self, path: str) -> None:
+        # Continue in a new file once everything queued so far is durable.
+        with self._cond:
+            self._drain()
+            self._file.close()
+            self._file = open(path, 'ab')
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._file.close()
+
+
+class Storage:
+    def __init__(self, data_dir: str, snapshot_every: int = 10000, snapshot_interval: float = 60.0):
+        os.makedirs(data_dir, exist_ok=True)
+        self.data_dir = data_dir
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.generation = 0
+        self.log: Optional[LogWriter] = None
+        self._since_snapshot = 0
+        self._due = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _path(self, kind: str, gen: int) -> str:
+        return os.path.join(self.data_dir, f'{kind}.{gen:08d}')
+
+    def _generations(self, kind: str) -> List[int]:
+        gens = []
+        for name in os.listdir(self.data_dir):
+            m = FILE_RE.match(name)
+            if m and m.group(1) == kind:
+                gens.append(int(m.group(2)))
+        return sorted(gens)
+
+    def recover(self) -> State:
+        snapshots = self._generations('snapshot')
+        base = snapshots[-1] if snapshots else 0
+        state = read_snapshot(self._path('snapshot', base)) if snapshots else {}
+        segments = [g for g in self._generations('log') if g >= base] or [base]
+        replayed = 0
+        for gen in segments:
+            path = self._path('log', gen)
+            if not os.path.exists(path):
+                continue
+            count, end = replay_log(path, state)
+            replayed += count
+            if end < os.path.getsize(path):
+                if gen != segments[-1]:
+                    raise ValueError(f'{path}: corrupt record at offset {end}')
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+                    os.fsync(f.fileno())
+        self.generation = segments[-1]
+        self.log = LogWriter(self._path('log', self.generation))
+        _fsync_dir(self.data_dir)
+        self._since_snapshot = replayed
+        return state
+
+    def _append(self, payload: bytes) -> int:
+        seq = self.log.append(payload)
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self._due.set()
+        return seq
+
+    def log_register(self, username: str, password: str) -> int:
+        return self._append(_encode(REGISTER, username, password))
+
+    def log_store(self, username: str, msg: str) -> int:
+        return self._append(_encode(STORE, username, msg))
+
+    def wait(self, seq: int) -> None:
+        self.log.wait(seq)
+
+    def rotate(self) -> int:
+        # Starts the next generation. The caller must block appends while this runs
+        # and capture the state that the new snapshot will hold.
+        self.generation += 1
+        self.log.switch(self._path('log', self.generation))
+        _fsync_dir(self.data_dir)
+        self._since_snapshot = 0
+        return self.generation
+
+    def write_snapshot(self, gen: int, rows: Iterable[Tuple[str, str, Optional[str]]]) -> None:
+        write_snapshot(self._path('snapshot', gen), rows)
+        for kind in ('log', 'snapshot'):
+            for old in self._generations(kind):
+                if old < gen:
+                    os.remove(self._path(kind, old))
+
+    def start(self, take_snapshot: Callable[[], None]) -> None:
+        # Runs take_snapshot every snapshot_interval seconds, or sooner once
+        # snapshot_every records have been logged, whenever there is anything new.
+        # A failed snapshot is reported and tried again at the next interval; the
+        # log segments it would have replaced are only deleted after a success.
+        def loop():
+            failed = False
+            while not self._stop.is_set():
+                self._due.wait(self.snapshot_interval)
+                self._due.clear()
+                if (self._since_snapshot or failed) and not self._stop.is_set():
+                    try:
+                        take_snapshot()
+                        failed = False
+                    except Exception as e:
+                        print(f'Snapshot failed, retrying in {self.snapshot_interval}s: {e}', file=sys.stderr)
+                        failed = True
+
+        self._thread = threading.Thread(target=loop, name='snapshotter', daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._due.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.log is not None:
+            self.log.close()
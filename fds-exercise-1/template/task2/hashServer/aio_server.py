@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import grpc
+
+import hservice_pb2
+import hservice_pb2_grpc
+import dservice_pb2
+import dservice_pb2_grpc
+from channel_pool import UNHEALTHY
+from server import digest_of
+
+
+class _AioEntry:
+    def __init__(self, target: str, options):
+        self.target = target
+        self.channel = grpc.aio.insecure_channel(target, options=options)
+        self.stub = dservice_pb2_grpc.DBStub(self.channel)
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.evicted = False
+        self.released = asyncio.Event()  # set when an evicted entry's last call returns
+
+
+class AioChannelPool:
+    # Same policy as channel_pool.ChannelPool for grpc.aio channels. Everything runs
+    # on the server's event loop, so no lock is needed. The channel state is polled
+    # on checkout, since aio channels do not take connectivity callbacks. Only idle
+    # entries are evicted; one dropped while serving a call is closed when the
+    # last call using it returns.
+    def __init__(self, max_size: int = 32, idle_timeout: float = 60.0, options=None):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.options = options if options is not None else [
+            ('grpc.keepalive_time_ms', 30000),
+            ('grpc.keepalive_permit_without_calls', 0),
+        ]
+        self._entries: 'OrderedDict[str, _AioEntry]' = OrderedDict()
+        self._busy: set = set()  # evicted entries still serving a call
+        self._closing: set = set()
+        self._closed = False
+
+    def _close(self, entry: _AioEntry) -> None:
+        task = asyncio.ensure_future(entry.channel.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _discard(self, entry: _AioEntry) -> None:
+        if self._entries.get(entry.target) is entry:
+            del self._entries[entry.target]
+        entry.evicted = True
+        if entry.in_use == 0:
+            self._close(entry)
+        else:
+            self._busy.add(entry)
+
+    def _sweep(self, now: float) -> int:
+        evicted = 0
+        for entry in list(self._entries.values()):
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout:
+                self._discard(entry)
+                evicted += 1
+        for entry in list(self._entries.values()):
+            if len(self._entries) <= self.max_size:
+                break
+            if entry.in_use == 0:
+                self._discard(entry)
+                evicted += 1
+        return evicted
+
+    @contextmanager
+    def stub(self, target: str) -> Iterator[dservice_pb2_grpc.DBStub]:
+        if self._closed:
+            raise RuntimeError('channel pool is closed')
+        now = time.monotonic()
+        entry = self._entries.get(target)
+        if entry is not None and entry.channel.get_state() in UNHEALTHY:
+            self._discard(entry)
+            entry = None
+        if entry is None:
+            entry = self._entries[target] = _AioEntry(target, self.options)
+        self._entries.move_to_end(target)
+        entry.in_use += 1
+        entry.last_used = now
+        self._sweep(now)
+        try:
+            yield entry.stub
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            if entry.evicted and entry.in_use == 0:
+                self._busy.discard(entry)
+                entry.released.set()
+                self._close(entry)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        return self._sweep(time.monotonic() if now is None else now)
+
+    async def run_eviction(self, interval: float = 10.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def close(self) -> None:
+        # Refuses new checkouts, then waits until every call still using a pooled
+        # channel has returned and all channels are closed.
+        self._closed = True
+        for entry in list(self._entries.values()):
+            self._discard(entry)
+        while self._busy or self._closing:
+            await asyncio.gather(*[e.released.wait() for e in list(self._busy)], *list(self._closing))
+
+
+class AioHashServer(hservice_pb2_grpc.HSServicer):
+    def __init__(self, pool: AioChannelPool = None):
+        self.pool = pool if pool is not None else AioChannelPool()
+        # data servers that answered UNIMPLEMENTED to GetAuthDataStream
+        self.unary_targets = set()
+
+    async def _hash(self, target: str, code: str) -> str:
+        passcode = dservice_pb2.Passcode(code=code)
+        with self.pool.stub(target) as d_stub:
+            if target not in self.unary_targets:
+                digest = hashlib.sha256()
+                try:
+                    async for chunk in d_stub.GetAuthDataStream(passcode):
+                        digest.update(chunk.data)
+                    return digest.hexdigest()
+                except grpc.aio.AioRpcError as e:
+                    if e.code() != grpc.StatusCode.UNIMPLEMENTED:
+                        raise
+                    self.unary_targets.add(target)
+            return digest_of(await d_stub.GetAuthData(passcode))
+
+    async def GetHash(self, request, context):
+        try:
+            digest = await self._hash(f"{request.ip}:{request.port}", request.passcode)
+        except grpc.aio.AioRpcError as e:
+            await context.abort(e.code(), e.details())
+        return hservice_pb2.Response(hash=digest)
+
+    async def GetHashBatch(self, request, context):
+        by_target = defaultdict(list)
+        for i, req in enumerate(request.requests):
+            by_target[f"{req.ip}:{req.port}"].append(i)
+        order, tasks = [], []
+        for target, indices in by_target.items():
+            for i in indices:
+                order.append(i)
+                tasks.append(asyncio.ensure_future(self._hash(target, request.requests[i].passcode)))
+        try:
+            digests = await asyncio.gather(*tasks)
+        except BaseException as e:
+            # gather leaves the other lookups running; cancelling a task cancels its RPC
+            for task in tasks:
+                task.cancel()
+            if isinstance(e, grpc.aio.AioRpcError):
+                await context.abort(e.code(), e.details())
+            raise
+        hashes = [''] * len(request.requests)
+        for i, digest in zip(order, digests):
+            hashes[i] = digest
+        return hservice_pb2.BatchResponse(responses=[hservice_pb2.Response(hash=h) for h in hashes])
+
+
+async def serve(port: int = 50052):
+    server = grpc.aio.server()
+    servicer = AioHashServer()
+    hservice_pb2_grpc.add_HSServicer_to_server(servicer, server)
+    server.add_insecure_port(f"[::]:{port}")
+    await server.start()
+    print(f"Async hash server listening on port {port}")
+    eviction = asyncio.ensure_future(servicer.pool.run_eviction())
+    try:
+        await server.wait_for_termination()
+    finally:
+        eviction.cancel()
+        await servicer.pool.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve(50052))
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import grpc
+
+import dservice_pb2_grpc
+
+# Channels in these states are replaced on the next checkout instead of being
+# reused; gRPC would otherwise keep retrying them with backoff while callers wait.
+UNHEALTHY = (grpc.ChannelConnectivity.TRANSIENT_FAILURE, grpc.ChannelConnectivity.SHUTDOWN)
+
+
+class _Entry:
+    def __init__(self, target: str, options):
+        self.target = target
+        self.channel = grpc.insecure_channel(target, options=options)
+        self.stub = dservice_pb2_grpc.DBStub(self.channel)
+        self.state = grpc.ChannelConnectivity.IDLE
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.evicted = False
+        self.channel.subscribe(self._on_state)
+
+    def _on_state(self, state: grpc.ChannelConnectivity) -> None:
+        self.state = state
+
+    def close(self) -> None:
+        self.channel.unsubscribe(self._on_state)
+        self.channel.close()
+
+
+class ChannelPool:
+    # One channel and DBStub per data server ip:port, shared by all worker threads.
+    # Entries idle for longer than idle_timeout are closed, and when more than
+    # max_size targets are open the least recently used idle one is dropped.
+    # Evicted channels still serving a call are closed when that call returns.
+    def __init__(self, max_size: int = 32, idle_timeout: float = 60.0, options=None):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.options = options if options is not None else [
+            ('grpc.keepalive_time_ms', 30000),
+            ('grpc.keepalive_permit_without_calls', 0),
+        ]
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _discard(self, entry: _Entry, to_close: list) -> None:
+        # caller holds the lock
+        if self._entries.get(entry.target) is entry:
+            del self._entries[entry.target]
+        entry.evicted = True
+        if entry.in_use == 0:
+            to_close.append(entry)
+
+    def _sweep(self, now: float, to_close: list) -> None:
+        for entry in list(self._entries.values()):
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout:
+                self._discard(entry, to_close)
+        if len(self._entries) > self.max_size:
+            for entry in list(self._entries.values()):
+                if len(self._entries) <= self.max_size:
+                    break
+                if entry.in_use == 0:
+                    self._discard(entry, to_close)
+
+    def _checkout(self, target: str) -> _Entry:
+        to_close: list = []
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('channel pool is closed')
+            now = time.monotonic()
+            entry = self._entries.get(target)
+            if entry is not None and entry.state in UNHEALTHY:
+                self._discard(entry, to_close)
+                entry = None
+            if entry is None:
+                entry = self._entries[target] = _Entry(target, self.options)
+            self._entries.move_to_end(target)
+            entry.in_use += 1
+            entry.last_used = now
+            self._sweep(now, to_close)
+        for e in to_close:
+            e.close()
+        return entry
+
+    def _checkin(self, entry: _Entry) -> None:
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            close = entry.evicted and entry.in_use == 0
+        if close:
+            entry.close()
+
+    @contextmanager
+    def stub(self, target: str) -> Iterator[dservice_pb2_grpc.DBStub]:
+        entry = self._checkout(target)
+        try:
+            yield entry.stub
+        finally:
+            self._checkin(entry)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        to_close: list = []
+        with self._lock:
+            self._sweep(time.monotonic() if now is None else now, to_close)
+        for e in to_close:
+            e.close()
+        return len(to_close)
+
+    def run_eviction(self, stop: threading.Event, interval: float = 10.0) -> None:
+        # Thread target: evicts idle entries every interval seconds until stop is set.
+        while not stop.wait(interval):
+            self.evict_idle()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            to_close: list = []
+            for entry in list(self._entries.values()):
+                self._discard(entry, to_close)
+        for entry in to_close:
+            entry.close()
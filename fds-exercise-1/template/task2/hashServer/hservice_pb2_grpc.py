@@ -39,6 +39,11 @@ class HSStub(object):
                 request_serializer=hservice__pb2.Request.SerializeToString,
                 response_deserializer=hservice__pb2.Response.FromString,
                 _registered_method=True)
+        self.GetHashBatch = channel.unary_unary(
+                '/Hash.HS/GetHashBatch',
+                request_serializer=hservice__pb2.BatchRequest.SerializeToString,
+                response_deserializer=hservice__pb2.BatchResponse.FromString,
+                _registered_method=True)
 
 
 class HSServicer(object):
@@ -50,6 +55,12 @@ class HSServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetHashBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_HSServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -58,6 +69,11 @@ def add_HSServicer_to_server(servicer, server):
                     request_deserializer=hservice__pb2.Request.FromString,
                     response_serializer=hservice__pb2.Response.SerializeToString,
             ),
+            'GetHashBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetHashBatch,
+                    request_deserializer=hservice__pb2.BatchRequest.FromString,
+                    response_serializer=hservice__pb2.BatchResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'Hash.HS', rpc_method_handlers)
@@ -95,3 +111,30 @@ class HS(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GetHashBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/Hash.HS/GetHashBatch',
+            hservice__pb2.BatchRequest.SerializeToString,
+            hservice__pb2.BatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
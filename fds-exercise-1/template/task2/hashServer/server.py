@@ -1,32 +1,118 @@
 import grpc
 import hashlib
+import threading
+from collections import defaultdict
 from concurrent import futures
+from contextlib import ExitStack
 
 import hservice_pb2
 import hservice_pb2_grpc
 import dservice_pb2
-import dservice_pb2_grpc
+from channel_pool import ChannelPool
+
+
+def digest_of(data) -> str:
+    msg = data.msg if data and hasattr(data, 'msg') else ''
+    return hashlib.sha256(msg.encode('utf-8')).hexdigest()
+
+
+def digest_stream(chunks) -> str:
+    # Chunks are hashed as they arrive, so memory does not grow with the message.
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk.data)
+    return digest.hexdigest()
 
 
 class HashServer(hservice_pb2_grpc.HSServicer):
+    def __init__(self, pool: ChannelPool = None):
+        self.pool = pool if pool is not None else ChannelPool()
+        # data servers that answered UNIMPLEMENTED to GetAuthDataStream
+        self.unary_targets = set()
+
+    def _hash(self, d_stub, target: str, code: str, call=None) -> str:
+        # `call` is a GetAuthDataStream call that was already started. A passcode is
+        # only redeemed by a successful call, so retrying it on the unary RPC is safe.
+        passcode = dservice_pb2.Passcode(code=code)
+        if target not in self.unary_targets:
+            try:
+                return digest_stream(call if call is not None else d_stub.GetAuthDataStream(passcode))
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.UNIMPLEMENTED:
+                    raise
+                self.unary_targets.add(target)
+        return digest_of(d_stub.GetAuthData(passcode))
+
     def GetHash(self, request, context):
         target = f"{request.ip}:{request.port}"
-        with grpc.insecure_channel(target) as channel:
-            d_stub = dservice_pb2_grpc.DBStub(channel)
-            data = d_stub.GetAuthData(dservice_pb2.Passcode(code=request.passcode))
+        with self.pool.stub(target) as d_stub:
+            try:
+                digest = self._hash(d_stub, target, request.passcode)
+            except grpc.RpcError as e:
+                context.abort(e.code(), e.details())
 
-        msg = data.msg if data and hasattr(data, 'msg') else ''
-        digest = hashlib.sha256(msg.encode('utf-8')).hexdigest()
         return hservice_pb2.Response(hash=digest)
 
+    def GetHashBatch(self, request, context):
+        # One pooled channel per data server; all lookups for that server are started
+        # before any result is awaited, so they overlap on the wire. The first lookup
+        # that fails cancels all the others as soon as it completes, and its status
+        # and details fail the batch.
+        by_target = defaultdict(list)
+        for i, req in enumerate(request.requests):
+            by_target[f"{req.ip}:{req.port}"].append(i)
+        hashes = [''] * len(request.requests)
+        pending = []
+        failures = []
+
+        def cancel_on_failure(call):
+            # UNIMPLEMENTED streams are retried on the unary RPC by _hash
+            if call.code() not in (grpc.StatusCode.OK, grpc.StatusCode.UNIMPLEMENTED, grpc.StatusCode.CANCELLED):
+                failures.append(call)
+                for _, _, _, _, other in pending:
+                    other.cancel()
+
+        with ExitStack() as stack:
+            try:
+                for target, indices in by_target.items():
+                    d_stub = stack.enter_context(self.pool.stub(target))
+                    for i in indices:
+                        passcode = dservice_pb2.Passcode(code=request.requests[i].passcode)
+                        if target in self.unary_targets:
+                            pending.append((i, target, d_stub, False, d_stub.GetAuthData.future(passcode)))
+                        else:
+                            pending.append((i, target, d_stub, True, d_stub.GetAuthDataStream(passcode)))
+                for _, _, _, _, call in pending:
+                    call.add_done_callback(cancel_on_failure)
+                for i, target, d_stub, streaming, call in pending:
+                    if streaming:
+                        hashes[i] = self._hash(d_stub, target, request.requests[i].passcode, call)
+                    else:
+                        hashes[i] = digest_of(call.result())
+            except BaseException as e:
+                for _, _, _, _, call in pending:
+                    call.cancel()
+                err = failures[0] if failures else e
+                if isinstance(err, grpc.RpcError):
+                    context.abort(err.code(), err.details())
+                raise
+        return hservice_pb2.BatchResponse(responses=[hservice_pb2.Response(hash=h) for h in hashes])
+
 
 def serve(port: int = 50052):
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    hservice_pb2_grpc.add_HSServicer_to_server(HashServer(), server)
+    servicer = HashServer()
+    hservice_pb2_grpc.add_HSServicer_to_server(servicer, server)
     server.add_insecure_port(f"[::]:{port}")
     server.start()
     print(f"Hash server listening on port {port}")
-    server.wait_for_termination()
+    stop = threading.Event()
+    threading.Thread(target=servicer.pool.run_eviction, args=(stop,), name='pool-eviction', daemon=True).start()
+    try:
+        server.wait_for_termination()
+    finally:
+        stop.set()
+        servicer.pool.close()
 
 
 if __name__ == '__main__':